@@ -1,31 +1,67 @@
 # digital_twin_agent/api/main.py
 
 import asyncio
-from fastapi import FastAPI
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 # Import the core agent runner function from our existing module.
-from core.agent import run_agent_with_dynamic_prompt
+from core.agent import run_agent_with_dynamic_prompt, get_prompt_metrics, warmup, is_warm, MAX_CONCURRENT_AGENTS
+from core.session_store import SessionStore
 
 # --- Pydantic Models for Data Validation ---
 class ChatRequest(BaseModel):
     """The structure of a request to the /chat endpoint."""
     message: str = Field(..., description="The new message from the user.")
-    history: List[Dict[str, Any]] = Field([], description="The previous conversation history.")
+    session_id: Optional[str] = Field(None, description="The conversation to continue. Omit it to start a new one.")
 
 class ChatResponse(BaseModel):
     """The structure of a response from the /chat endpoint."""
+    session_id: str = Field(..., description="The conversation's ID, to send with the next message.")
     reply: str = Field(..., description="The agent's final text response.")
-    history: List[Dict[str, Any]] = Field(..., description="The updated conversation history.")
+    messages: List[Dict[str, Any]] = Field(..., description="The messages added to the conversation by this turn.")
+
+# --- Warm-up ---
+# Credentials, API clients, vector stores and the embedding model are loaded in the background at startup,
+# so the server accepts connections immediately. GET /ready reports when they are loaded.
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'true').lower() == 'true'
+warmup_error = None
+
+def run_warmup():
+    global warmup_error
+    try:
+        warmup()
+    except Exception as e:
+        warmup_error = str(e)
+        print(f"Warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=run_warmup, name='warmup', daemon=True).start()
+    yield
 
 # --- Initialize FastAPI Application ---
 app = FastAPI(
     title="Digital Twin AI Assistant API",
     description="API for interacting with a proactive, personalized AI assistant.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Conversation histories live on the server; clients only send the new message.
+session_store = SessionStore()
+# Sessions with a turn in progress. A second message for the same session is rejected until it finishes.
+active_sessions = set()
+
+# Requests beyond the concurrency limit wait here, on the event loop, instead of tying up worker threads.
+chat_slots = asyncio.Semaphore(MAX_CONCURRENT_AGENTS)
+
 # --- Synchronous Helper Function ---
 def get_agent_response(chat_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
@@ -38,34 +74,218 @@ def get_agent_response(chat_history: List[Dict[str, Any]]) -> List[Dict[str, Any
         final_response_list = response
     return final_response_list
 
+# --- Streaming Helpers ---
+# Tool results can be whole email threads; progress events only carry a preview.
+TOOL_RESULT_PREVIEW_CHARS = 300
+
+class ResponseEventTracker:
+    """
+    Turns the agent's stream of cumulative response lists into incremental events:
+    'delta' for new assistant text, 'tool_call' when the agent starts calling a tool,
+    and 'tool_result' when a tool returns.
+    """
+    def __init__(self):
+        self._sent_chars = {}
+        self._announced = set()
+
+    def events(self, response: List[Dict[str, Any]]) -> List[tuple]:
+        """Returns the (event, data) pairs that are new in `response` since the previous call."""
+        events = []
+        for i, message in enumerate(response):
+            role = message.get('role')
+            if role == 'assistant':
+                content = message.get('content') or ''
+                if isinstance(content, str) and len(content) > self._sent_chars.get(i, 0):
+                    events.append(('delta', {'content': content[self._sent_chars.get(i, 0):]}))
+                    self._sent_chars[i] = len(content)
+                function_call = message.get('function_call')
+                if function_call and function_call.get('name') and ('call', i) not in self._announced:
+                    self._announced.add(('call', i))
+                    events.append(('tool_call', {'name': function_call['name']}))
+            elif role == 'function' and ('result', i) not in self._announced:
+                self._announced.add(('result', i))
+                content = str(message.get('content', ''))
+                events.append(('tool_result', {'name': message.get('name'), 'preview': content[:TOOL_RESULT_PREVIEW_CHARS]}))
+        return events
+
+SESSION_BUSY_MESSAGE = "A message for this session is still being processed."
+
+def claim_session(session_id: str) -> bool:
+    """Marks a session as having a turn in progress. Returns False if it already has one."""
+    if session_id in active_sessions:
+        return False
+    active_sessions.add(session_id)
+    return True
+
+def begin_turn(request: ChatRequest) -> tuple:
+    """
+    Resolves the request's session and checks that it is idle. The caller marks it busy with `claim_session`
+    right before the code whose `finally` releases it, so a claimed session is always released.
+
+    Returns:
+        tuple: The session ID, the user's new message, and the history to run the agent on.
+
+    Raises:
+        HTTPException: 404 if the session is unknown or expired, 409 if it already has a turn in progress.
+    """
+    session_id = request.session_id or session_store.create()
+    history = session_store.get(session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session. Start a new conversation.")
+    if session_id in active_sessions:
+        raise HTTPException(status_code=409, detail=SESSION_BUSY_MESSAGE)
+    user_message = {'role': 'user', 'content': request.message}
+    return session_id, user_message, history + [user_message]
+
+def close_when_idle(response_stream, step: asyncio.Future = None):
+    """
+    Closes an agent response generator, returning its agent to the pool, once no worker thread is advancing it.
+
+    When a client disconnects mid-step, the awaiting coroutine is cancelled but the worker thread keeps
+    running `next` on the generator, and closing it then would raise "generator already executing".
+    The close is deferred until that step has finished, and runs on a worker thread since it may block.
+
+    Args:
+        response_stream (generator): The generator returned by `run_agent_with_dynamic_prompt`.
+        step (asyncio.Future): The future of the most recent `next` call on it, if any.
+    """
+    loop = asyncio.get_running_loop()
+
+    def _close(_=None):
+        if step is not None and not step.cancelled():
+            # Retrieves the exception of a step nobody awaited any more, so it is not logged as unhandled.
+            step.exception()
+        loop.run_in_executor(None, response_stream.close)
+
+    if step is None or step.done():
+        _close()
+    else:
+        step.add_done_callback(_close)
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 # --- API Endpoint Definition ---
 @app.post("/chat", response_model=ChatResponse, tags=["Agent Interaction"])
 async def chat_with_agent(request: ChatRequest):
     """
-    Receives a user message and conversation history, runs the agent in a separate
-    thread to avoid blocking the server, and returns the agent's final response.
+    Receives a user message for a session, runs the agent in a separate thread to avoid
+    blocking the server, and returns the agent's final response with the messages it added.
+    Each request runs on its own agent instance; at most MAX_CONCURRENT_AGENTS run at once.
     """
     print(f"Received async chat request: {request.message}")
 
-    chat_history = request.history
-    chat_history.append({'role': 'user', 'content': request.message})
-    
-    # Run the blocking, synchronous `get_agent_response` function in a separate thread
-    # and wait for its result without blocking the main FastAPI event loop.
-    final_response_list = await asyncio.to_thread(get_agent_response, chat_history)
+    session_id, user_message, chat_history = begin_turn(request)
+    if not claim_session(session_id):
+        raise HTTPException(status_code=409, detail=SESSION_BUSY_MESSAGE)
+    try:
+        # Run the blocking, synchronous `get_agent_response` function in a separate thread
+        # and wait for its result without blocking the main FastAPI event loop.
+        async with chat_slots:
+            final_response_list = await asyncio.to_thread(get_agent_response, chat_history)
+    finally:
+        active_sessions.discard(session_id)
     
     if final_response_list:
         assistant_reply = final_response_list[-1]['content']
-        chat_history.extend(final_response_list)
+        new_messages = [user_message] + final_response_list
+        session_store.append(session_id, new_messages)
         
-        return ChatResponse(reply=assistant_reply, history=chat_history)
+        return ChatResponse(session_id=session_id, reply=assistant_reply, messages=new_messages)
     else:
         # Handle cases where the agent might fail
         return ChatResponse(
+            session_id=session_id,
             reply="I'm sorry, I encountered an error and couldn't process your request.",
-            history=chat_history
+            messages=[]
         )
 
+@app.post("/chat/stream", tags=["Agent Interaction"])
+async def chat_with_agent_stream(request: ChatRequest):
+    """
+    Like /chat, but streams the turn as server-sent events while the agent works:
+    'delta' events carry new reply text, 'tool_call' and 'tool_result' events report tool progress,
+    and a final 'done' event carries the session ID, the reply and the messages added by this turn
+    (or 'error' if the run failed).
+    """
+    print(f"Received streaming chat request: {request.message}")
+
+    session_id, user_message, chat_history = begin_turn(request)
+    error_message = "I'm sorry, I encountered an error and couldn't process your request."
+
+    async def event_stream():
+        # Claimed here rather than in the handler: if the body is never iterated (the client dropped before
+        # the first chunk, or sending the headers failed), nothing is claimed and nothing needs releasing.
+        if not claim_session(session_id):
+            yield format_sse('error', {'session_id': session_id, 'message': SESSION_BUSY_MESSAGE})
+            return
+        try:
+            async with chat_slots:
+                tracker = ResponseEventTracker()
+                response_stream = run_agent_with_dynamic_prompt(chat_history)
+                final_response_list = None
+                step = None
+                try:
+                    while True:
+                        # Each step of the synchronous generator runs in a worker thread. The step is shielded,
+                        # so a client disconnect leaves its future pending until the thread is done with the generator.
+                        step = asyncio.ensure_future(asyncio.to_thread(next, response_stream, None))
+                        response = await asyncio.shield(step)
+                        if response is None:
+                            break
+                        final_response_list = response
+                        for event, data in tracker.events(response):
+                            yield format_sse(event, data)
+                except Exception as e:
+                    print(f"Error while streaming agent response: {e}")
+                    yield format_sse('error', {'session_id': session_id, 'message': error_message})
+                    return
+                finally:
+                    # Returns the agent to the pool even if the client disconnected mid-stream.
+                    close_when_idle(response_stream, step)
+
+            if final_response_list:
+                new_messages = [user_message] + final_response_list
+                session_store.append(session_id, new_messages)
+                yield format_sse('done', {
+                    'session_id': session_id,
+                    'reply': final_response_list[-1]['content'],
+                    'messages': new_messages
+                })
+            else:
+                yield format_sse('error', {'session_id': session_id, 'message': error_message})
+        finally:
+            active_sessions.discard(session_id)
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.delete("/sessions/{session_id}", tags=["Agent Interaction"])
+def delete_session(session_id: str):
+    """Forgets a conversation's server-side history."""
+    session_store.delete(session_id)
+    return {"status": "deleted", "session_id": session_id}
+
+@app.get("/metrics/prompt", tags=["Monitoring"])
+def read_prompt_metrics():
+    """Returns estimated prompt tokens before and after history compaction for recent LLM turns."""
+    return {"turns": get_prompt_metrics()}
+
+@app.get("/ready", tags=["Health Check"])
+def read_ready():
+    """
+    Reports whether the assistant has finished warming up. Returns 503 until then, so a load balancer
+    or orchestrator only routes traffic to a warm instance. Unlike `/`, this is not a liveness check.
+    """
+    if is_warm() or not WARMUP_ON_STARTUP:
+        return {"status": "ready"}
+    if warmup_error is not None:
+        return JSONResponse(status_code=503, content={"status": "warm-up failed", "error": warmup_error})
+    return JSONResponse(status_code=503, content={"status": "warming up"})
+
 # --- Root Endpoint for Health Check ---
 @app.get("/", tags=["Health Check"])
 def read_root():
@@ -3,49 +3,88 @@
 import gradio as gr
 import requests
 import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional
 
 # The URL of our running FastAPI backend
-FASTAPI_URL = "http://127.0.0.1:8000/chat"
-
-def call_chat_api(message: str, api_history: List[Dict[str, Any]]) -> Tuple[str, List[List[str]], List[Dict[str, Any]]]:
+FASTAPI_STREAM_URL = "http://127.0.0.1:8000/chat/stream"
+
+# Friendly progress messages shown while the agent is using a tool.
+TOOL_STATUS = {
+    'google_calendar_reader': "Checking your calendar...",
+    'calendar_slot_finder': "Looking for free time in your calendar...",
+    'gmail_reader': "Reading your inbox...",
+    'style_retriever': "Looking up how you usually write...",
+    'email_content_retriever': "Searching your past emails...",
+    'gmail_sender': "Sending the email...",
+    'calendar_event_creator': "Creating the calendar event...",
+}
+
+SESSION_EXPIRED_MESSAGE = "Your previous conversation has expired on the server. Please send your message again to start a new one."
+SESSION_BUSY_MESSAGE = "Your previous message is still being answered. Please wait for that reply before sending another one."
+
+def stream_chat_api(message: str, api_history: List[Dict[str, Any]], session_id: Optional[str]):
     """
-    Makes a POST request to the FastAPI backend to get the agent's response.
-    Correctly handles complex histories involving tool calls for display.
+    Streams the agent's response from the FastAPI backend's server-sent events endpoint,
+    updating the chat display as each piece of text or tool progress arrives.
+    Only the new message and the session ID are sent; the server keeps the history and
+    returns just the messages this turn added, which are appended to the local transcript.
+    Yields (textbox, display history, API history, session ID) tuples for the Gradio outputs.
     """
     if not message or not message.strip():
-        # On page load, just format the existing history for display.
-        display_history = format_history_for_display(api_history)
-        return "", display_history, api_history
+        yield "", format_history_for_display(api_history), api_history, session_id
+        return
 
-    # Prepare the request payload
     payload = {
         "message": message,
-        "history": api_history
+        "session_id": session_id
     }
-    
+    display_history = format_history_for_display(api_history)
+    display_history.append([message, None])
+    reply_text = ""
+    status = ""
+
     try:
-        response = requests.post(FASTAPI_URL, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        
-        # The API returns the full updated history. This is our new source of truth.
-        updated_api_history = data.get("history", [])
-        
-        # Reformat the entire new history for display in the Gradio chatbot.
-        display_history = format_history_for_display(updated_api_history)
-        
-        return "", display_history, updated_api_history
+        with requests.post(FASTAPI_STREAM_URL, json=payload, stream=True) as response:
+            if response.status_code == 404:
+                yield "", [[message, SESSION_EXPIRED_MESSAGE]], [], None
+                return
+            if response.status_code == 409:
+                # Not a connection problem: the server is still answering this session's last message.
+                display_history[-1][1] = SESSION_BUSY_MESSAGE
+                yield "", display_history, api_history, session_id
+                return
+            response.raise_for_status()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    continue
+                if not line.startswith("data: "):
+                    continue
+                data = json.loads(line[len("data: "):])
+
+                if event == "delta":
+                    reply_text += data["content"]
+                    status = ""
+                elif event == "tool_call":
+                    status = TOOL_STATUS.get(data["name"], f"Using {data['name']}...")
+                elif event == "done":
+                    # The API returns only this turn's messages; append them to our local transcript.
+                    updated_api_history = api_history + data.get("messages", [])
+                    yield "", format_history_for_display(updated_api_history), updated_api_history, data["session_id"]
+                    return
+                elif event == "error":
+                    display_history[-1][1] = data["message"]
+                    yield "", display_history, api_history, data.get("session_id", session_id)
+                    return
+
+                display_history[-1][1] = f"{reply_text}\n\n_{status}_" if status else reply_text
+                yield "", display_history, api_history, session_id
 
     except requests.exceptions.RequestException as e:
         print(f"Error calling FastAPI backend: {e}")
-        error_message = f"Error: Could not connect to the backend at {FASTAPI_URL}. Please ensure the FastAPI server is running."
-        
-        # Format existing history and append the error message for display
-        display_history = format_history_for_display(api_history)
-        display_history.append([message, error_message])
-
-        return "", display_history, api_history
+        display_history[-1][1] = f"Error: Could not connect to the backend at {FASTAPI_STREAM_URL}. Please ensure the FastAPI server is running."
+        yield "", display_history, api_history, session_id
 
 def format_history_for_display(api_history: List[Dict[str, Any]]) -> List[List[str]]:
     """
@@ -81,8 +120,10 @@ def format_history_for_display(api_history: List[Dict[str, Any]]) -> List[List[s
 # --- Gradio Interface Definition ---
 
 with gr.Blocks(theme=gr.themes.Soft(), title="Digital Twin Assistant") as demo:
-    # State variable to store the conversation history in the API's format
+    # State variables: a local transcript of the conversation in the API's format (used for display only),
+    # and the server-side session that holds the history the agent sees.
     api_history = gr.State([])
+    session_id = gr.State(None)
 
     gr.Markdown(
         """
@@ -102,14 +143,14 @@ with gr.Blocks(theme=gr.themes.Soft(), title="Digital Twin Assistant") as demo:
         btn_send = gr.Button("Send", variant="primary", scale=1)
 
     txt_message.submit(
-        call_chat_api,
-        inputs=[txt_message, api_history],
-        outputs=[txt_message, chatbot, api_history],
+        stream_chat_api,
+        inputs=[txt_message, api_history, session_id],
+        outputs=[txt_message, chatbot, api_history, session_id],
     )
     btn_send.click(
-        call_chat_api,
-        inputs=[txt_message, api_history],
-        outputs=[txt_message, chatbot, api_history],
+        stream_chat_api,
+        inputs=[txt_message, api_history, session_id],
+        outputs=[txt_message, chatbot, api_history, session_id],
     )
 
 # Launch the Gradio web server
@@ -0,0 +1,61 @@
+# digital_twin_agent/benchmarks/bench_agent_concurrency.py
+
+"""
+Load test for the per-request agent pool. Stub agents stand in for qwen-agent's
+Assistant and spend a fixed time per run (like an LLM call plus a tool call).
+The test serves a burst of chat requests with different numbers of worker threads.
+It checks that no request ever sees another request's system prompt, and reports
+throughput.
+
+Run from the project root:
+    python -m benchmarks.bench_agent_concurrency
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.agent_pool import AgentPool
+
+# Simulated time one agent run spends waiting on the LLM and tools.
+RUN_SECONDS = 0.2
+REQUESTS = 32
+
+
+class StubAgent:
+    """Mimics Assistant.run: yields incremental responses and reads its own system prompt."""
+    def __init__(self):
+        self.system_message = None
+
+    def run(self, messages):
+        prompt = self.system_message
+        for step in range(4):
+            time.sleep(RUN_SECONDS / 4)
+            # A shared, mutated agent would fail this check under concurrency.
+            assert self.system_message == prompt, "system prompt changed mid-run"
+            yield [{'role': 'assistant', 'content': f"{messages[-1]['content']} (step {step})"}]
+
+
+def serve(pool, request_id):
+    with pool.acquire() as agent:
+        agent.system_message = f"prompt for request {request_id}"
+        final = None
+        for response in agent.run([{'role': 'user', 'content': f'request {request_id}'}]):
+            final = response
+        return final
+
+
+def main():
+    print(f"{REQUESTS} requests, {RUN_SECONDS * 1000:.0f} ms per agent run\n")
+    print(f"{'workers':>7} | {'wall time (s)':>13} | {'requests/s':>10} | {'agents built':>12}")
+    for workers in (1, 2, 4, 8, 16):
+        pool = AgentPool(StubAgent, max_size=workers)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda i: serve(pool, i), range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+        assert all(result[-1]['content'].startswith(f'request {i} ') for i, result in enumerate(results))
+        print(f"{workers:>7} | {elapsed:>13.2f} | {REQUESTS / elapsed:>10.1f} | {pool.stats()['created']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# digital_twin_agent/benchmarks/bench_email_text.py
+
+"""
+Compares the previous email body extraction (first text/plain part, one regex split)
+with core.email_text on a fixture corpus of raw Gmail message resources
+(benchmarks/fixtures/gmail_payloads.json).
+
+The corpus covers plain, HTML-only, nested multipart and single-part messages, Gmail,
+Apple, Outlook and "Original Message" reply formats, signatures, a non-UTF-8 charset,
+CRLF line endings and a very long line. Each fixture names a phrase the cleaned text
+must contain and, optionally, one from the quoted reply or signature it must not.
+
+For each message the script reports the median time per extraction and whether the
+email was recovered (a body came back) and cleaned correctly.
+
+Run from the project root:
+    python -m benchmarks.bench_email_text
+"""
+
+import base64
+import json
+import os
+import re
+import statistics
+import time
+
+from core.email_text import extract_clean_text
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'gmail_payloads.json')
+REPEATS = 50
+
+
+def legacy_extract_clean_text(msg):
+    """The extraction GmailTool used before core.email_text."""
+    def find_plain_text_part(parts):
+        for part in parts:
+            if part.get('mimeType') == 'text/plain' and 'data' in part['body']:
+                return part['body']['data']
+            if 'parts' in part:
+                result = find_plain_text_part(part['parts'])
+                if result:
+                    return result
+        return None
+
+    payload = msg.get('payload') if msg else None
+    if payload and payload.get('parts'):
+        body_data = find_plain_text_part(payload['parts'])
+        if body_data:
+            text = base64.urlsafe_b64decode(body_data).decode('utf-8')
+            text = re.split(r'\n>|On .* wrote:', text)[0]
+            text = text.split('-- \n')[0]
+            return text.strip()
+    return None
+
+
+def run(extract, msg):
+    """Returns (median seconds per call, result), with exceptions counted as no result."""
+    timings, result = [], None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        try:
+            result = extract(msg)
+        except Exception:
+            result = None
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def correct(fixture, text):
+    return bool(text) and fixture['expected'] in text and not (fixture['unexpected'] and fixture['unexpected'] in text)
+
+
+def main():
+    with open(FIXTURES, encoding='utf-8') as f:
+        fixtures = json.load(f)
+
+    totals = {'legacy': [[], 0, 0], 'new': [[], 0, 0]}
+    print(f"{'fixture':<52} | {'legacy (us)':>11} | {'new (us)':>8} | {'legacy':>9} | {'new':>9}")
+    for fixture in fixtures:
+        row = []
+        for label, extract in (('legacy', legacy_extract_clean_text), ('new', extract_clean_text)):
+            seconds, text = run(extract, fixture['message'])
+            recovered, ok = bool(text), correct(fixture, text)
+            totals[label][0].append(seconds)
+            totals[label][1] += recovered
+            totals[label][2] += ok
+            row.append((seconds, 'ok' if ok else 'unclean' if recovered else 'lost'))
+        (legacy_time, legacy_status), (new_time, new_status) = row
+        print(f"{fixture['description'][:52]:<52} | {legacy_time * 1e6:>11.1f} | {new_time * 1e6:>8.1f} | "
+              f"{legacy_status:>9} | {new_status:>9}")
+
+    print()
+    for label, (timings, recovered, ok) in totals.items():
+        print(f"{label:<6}: median {statistics.median(timings) * 1e6:6.1f} us, mean {statistics.mean(timings) * 1e6:8.1f} us "
+              f"per message; {recovered}/{len(fixtures)} emails recovered, {ok}/{len(fixtures)} cleaned correctly")
+
+
+if __name__ == '__main__':
+    main()
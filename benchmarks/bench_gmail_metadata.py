@@ -0,0 +1,130 @@
+# digital_twin_agent/benchmarks/bench_gmail_metadata.py
+
+"""
+Compares the old one-`messages.get`-per-email unread summary with the batched
+metadata fetch used by `GmailTool`, against a local fake Gmail service that
+charges a fixed latency per HTTP round trip.
+
+Run from the project root:
+    python -m benchmarks.bench_gmail_metadata
+"""
+
+import time
+
+from tools.email_tools import list_message_ids, fetch_message_metadata
+
+# Simulated cost of one HTTP round trip to Gmail, and the extra server time per call inside a batch.
+ROUND_TRIP_SECONDS = 0.02
+PER_BATCH_ITEM_SECONDS = 0.0005
+
+
+class _FakeRequest:
+    def __init__(self, handler):
+        self._handler = handler
+
+    def execute(self):
+        time.sleep(ROUND_TRIP_SECONDS)
+        return self._handler()
+
+
+class _FakeBatch:
+    def __init__(self, callback):
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        time.sleep(ROUND_TRIP_SECONDS + PER_BATCH_ITEM_SECONDS * len(self._requests))
+        for request_id, request in self._requests:
+            self._callback(request_id, request._handler(), None)
+
+
+class _FakeMessages:
+    def __init__(self, mailbox):
+        self._mailbox = mailbox
+
+    def list(self, userId, q, maxResults, pageToken=None):
+        offset = int(pageToken or 0)
+        page = self._mailbox[offset:offset + maxResults]
+        next_offset = offset + len(page)
+
+        def handler():
+            result = {'messages': [{'id': m['id']} for m in page]}
+            if next_offset < len(self._mailbox):
+                result['nextPageToken'] = str(next_offset)
+            return result
+        return _FakeRequest(handler)
+
+    def get(self, userId, id, format=None, metadataHeaders=None):
+        message = next(m for m in self._mailbox if m['id'] == id)
+        return _FakeRequest(lambda: message)
+
+
+class _FakeUsers:
+    def __init__(self, mailbox):
+        self._messages = _FakeMessages(mailbox)
+
+    def messages(self):
+        return self._messages
+
+
+class FakeGmailService:
+    """The subset of the Gmail API surface used by the unread summary."""
+    def __init__(self, message_count):
+        self._users = _FakeUsers([
+            {
+                'id': f'msg{i}',
+                'payload': {'headers': [
+                    {'name': 'Subject', 'value': f'Subject {i}'},
+                    {'name': 'From', 'value': f'Sender {i} <sender{i}@example.com>'},
+                    {'name': 'To', 'value': 'me@example.com'},
+                ]}
+            }
+            for i in range(message_count)
+        ])
+
+    def users(self):
+        return self._users
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(callback)
+
+
+def sequential_fetch(service, max_results):
+    """The original implementation: one list call, then one get call per message."""
+    results = service.users().messages().list(userId='me', q='is:unread', maxResults=max_results).execute()
+    summaries = []
+    for message in results.get('messages', []):
+        msg = service.users().messages().get(userId='me', id=message['id'], format='metadata').execute()
+        headers = msg['payload']['headers']
+        summaries.append(next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject'))
+    return summaries
+
+
+def batched_fetch(service, max_results):
+    message_ids = list_message_ids(service, 'is:unread', max_results)
+    return [m.get('Subject') for m in fetch_message_metadata(service, message_ids)]
+
+
+def main():
+    print(f"Simulated round trip: {ROUND_TRIP_SECONDS * 1000:.0f} ms\n")
+    print(f"{'messages':>8} | {'sequential (s)':>14} | {'batched (s)':>11} | {'speed-up':>8}")
+    for message_count in (10, 25, 50, 100, 250):
+        service = FakeGmailService(message_count)
+
+        start = time.perf_counter()
+        sequential = sequential_fetch(service, message_count)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = batched_fetch(service, message_count)
+        batched_time = time.perf_counter() - start
+
+        assert sequential == batched
+        print(f"{message_count:>8} | {sequential_time:>14.3f} | {batched_time:>11.3f} | {sequential_time / batched_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
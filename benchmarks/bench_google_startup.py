@@ -0,0 +1,75 @@
+# digital_twin_agent/benchmarks/bench_google_startup.py
+
+"""
+Measures how long the Google tools take to get authorized API clients at startup.
+
+"before" repeats what each of the four Google tools used to do in its constructor:
+unpickle token.pickle and build its own client. "after" goes through the shared
+credentials manager and the client cache in core.auth, so the token is loaded once
+and there is one client per API and thread.
+
+If token.pickle exists, the user's real credentials are used. Expired tokens are
+then refreshed, which adds one network round trip to both columns. Without a token
+file, anonymous credentials are used, so only the local loading and client build
+costs are measured. No browser flow is ever started.
+
+Run from the project root:
+    python -m benchmarks.bench_google_startup
+"""
+
+import os
+import pickle
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+
+import core.auth as auth
+
+# The (API, version) each Google tool needed: gmail_reader, gmail_sender, calendar reader and creator.
+TOOL_APIS = [('gmail', 'v1'), ('gmail', 'v1'), ('calendar', 'v3'), ('calendar', 'v3')]
+ROUNDS = 5
+
+
+def load_token():
+    if not os.path.exists(auth.TOKEN_PATH):
+        return AnonymousCredentials()
+    with open(auth.TOKEN_PATH, 'rb') as token:
+        return pickle.load(token)
+
+
+def before() -> float:
+    start = time.perf_counter()
+    for api_name, api_version in TOOL_APIS:
+        build(api_name, api_version, credentials=load_token())
+    return time.perf_counter() - start
+
+
+def after() -> float:
+    # A fresh manager and client cache, as at process start.
+    auth.credentials_manager = auth.CredentialsManager()
+    auth._thread_clients.__dict__.clear()
+    if not os.path.exists(auth.TOKEN_PATH):
+        auth.credentials_manager._creds = AnonymousCredentials()
+    start = time.perf_counter()
+    for api_name, api_version in TOOL_APIS:
+        auth.get_service(api_name, api_version)
+    return time.perf_counter() - start
+
+
+def main():
+    source = 'token.pickle' if os.path.exists(auth.TOKEN_PATH) else 'anonymous credentials (no token.pickle)'
+    print(f"Startup cost of {len(TOOL_APIS)} Google tools, {ROUNDS} rounds, using {source}\n")
+    # The first build imports and parses the bundled discovery documents; keep that out of both columns.
+    build('gmail', 'v1', credentials=AnonymousCredentials())
+    build('calendar', 'v3', credentials=AnonymousCredentials())
+    before_times = [before() for _ in range(ROUNDS)]
+    after_times = [after() for _ in range(ROUNDS)]
+    print(f"{'':>7} | {'median (ms)':>11} | {'min (ms)':>8}")
+    for label, times in (('before', before_times), ('after', after_times)):
+        times = sorted(times)
+        print(f"{label:>7} | {times[len(times) // 2] * 1000:>11.1f} | {times[0] * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# digital_twin_agent/benchmarks/bench_mailbox_mirror.py
+
+"""
+Keyword lookup latency of the local mailbox mirror on a synthetic mailbox.
+
+Builds a temporary mirror of --emails messages, each with a random body and a few
+invoice numbers, then times exact-term questions ("what did X say about invoice N"),
+with and without sender/date filters, and checks that the email holding the term
+is the top hit. No network access or credentials are needed.
+
+Run from the project root:
+    python -m benchmarks.bench_mailbox_mirror --emails 20000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from core.mailbox_mirror import MailboxMirror
+
+WORDS = ('project meeting budget review deadline draft update schedule client contract proposal '
+         'quarter report travel payment team launch feedback agenda notes follow estimate').split()
+SENDERS = [f'person{i}@example.com' for i in range(200)]
+START = 1_672_531_200  # 2023-01-01
+YEAR = 365 * 86400
+
+
+def synthetic_rows(count: int, rng: random.Random) -> list[dict]:
+    rows = []
+    for i in range(count):
+        words = rng.choices(WORDS, k=rng.randint(40, 300))
+        words.insert(rng.randrange(len(words)), f'invoice {100000 + i}')
+        rows.append({
+            'message_id': f'm{i}', 'thread_id': f't{i // 3}', 'from': rng.choice(SENDERS),
+            'to_all': 'me@example.com', 'subject': ' '.join(rng.choices(WORDS, k=4)),
+            'date': START + rng.randrange(YEAR), 'label_ids': 'INBOX', 'body': ' '.join(words)
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyword search in the mailbox mirror.")
+    parser.add_argument('--emails', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as directory:
+        mirror = MailboxMirror(os.path.join(directory, 'mailbox.sqlite3'))
+        rows = synthetic_rows(args.emails, rng)
+        start = time.perf_counter()
+        for i in range(0, len(rows), 500):
+            mirror.upsert_many(rows[i:i + 500])
+        print(f"Indexed {mirror.count()} emails in {time.perf_counter() - start:.2f}s "
+              f"({os.path.getsize(mirror.path) / 1e6:.1f} MB)\n")
+
+        targets = rng.sample(rows, args.queries)
+        variants = {
+            'terms only': lambda row: {},
+            'with sender': lambda row: {'sender': row['from']},
+            'with date range': lambda row: {'after': row['date'] - 86400, 'before': row['date'] + 86400},
+        }
+        print(f"{'query':<16} | {'median (ms)':>11} | {'p95 (ms)':>8} | {'top hit correct':>15}")
+        for label, filters in variants.items():
+            timings, correct = [], 0
+            for row in targets:
+                number = row['body'].split('invoice ')[1].split()[0]
+                question = f"What did {row['from'].split('@')[0]} say about invoice {number}?"
+                start = time.perf_counter()
+                hits = mirror.search(question, limit=10, **filters(row))
+                timings.append((time.perf_counter() - start) * 1000)
+                correct += bool(hits) and hits[0]['message_id'] == row['message_id']
+            timings.sort()
+            print(f"{label:<16} | {statistics.median(timings):>11.2f} | {timings[int(len(timings) * 0.95)]:>8.2f} | "
+                  f"{correct:>7}/{len(targets)}")
+
+
+if __name__ == '__main__':
+    main()
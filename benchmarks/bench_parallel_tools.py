@@ -0,0 +1,115 @@
+# digital_twin_agent/benchmarks/bench_parallel_tools.py
+
+"""
+Latency comparison for running one LLM step's tool calls sequentially and through
+ToolCallScheduler. Stub tools sleep for a fixed time, standing in for Gmail, Calendar
+and vector-store calls.
+
+The step loop below mirrors qwen-agent's FnCallAgent: the LLM output is appended to
+the history, then each call runs in order and its result is appended. The scheduled
+variant hooks the per-call function in the same way DigitalTwinAssistant._call_tool
+does. The script also checks the ordering guarantees: results arrive in call order,
+a write call never overlaps another call, and no call after a write starts early.
+
+Run from the project root:
+    python -m benchmarks.bench_parallel_tools
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.tool_scheduler import ToolCallScheduler, current_step_calls
+
+TOOL_DELAYS = {
+    'gmail_reader': 0.40,
+    'google_calendar_reader': 0.30,
+    'style_retriever': 0.20,
+    'email_content_retriever': 0.25,
+    'gmail_sender': 0.30,
+}
+READ_ONLY_TOOLS = {'gmail_reader', 'google_calendar_reader', 'style_retriever', 'email_content_retriever'}
+
+STEPS = {
+    'inbox + schedule + style': ['gmail_reader', 'google_calendar_reader', 'style_retriever'],
+    'four reads': ['gmail_reader', 'google_calendar_reader', 'style_retriever', 'email_content_retriever'],
+    'read, write, read': ['gmail_reader', 'google_calendar_reader', 'gmail_sender', 'style_retriever'],
+    'single read': ['gmail_reader'],
+}
+
+
+class StubTools:
+    """Sleeps per tool and records when each call ran."""
+    def __init__(self):
+        self.timeline = []
+        self._lock = threading.Lock()
+
+    def call(self, tool_name, tool_args):
+        start = time.perf_counter()
+        time.sleep(TOOL_DELAYS[tool_name])
+        with self._lock:
+            self.timeline.append((tool_name, start, time.perf_counter()))
+        return json.dumps({'tool': tool_name, 'args': json.loads(tool_args)})
+
+
+def run_step(tool_names, call_tool):
+    """Executes one step the way FnCallAgent._run does, returning the function results in order."""
+    messages = [{'role': 'user', 'content': 'summarise my inbox and schedule, then draft a reply'}]
+    messages.extend({'role': 'assistant', 'content': '',
+                     'function_call': {'name': name, 'arguments': json.dumps({'n': i})}}
+                    for i, name in enumerate(tool_names))
+    results = []
+    for i, name in enumerate(tool_names):
+        result = call_tool(name, json.dumps({'n': i}), messages=messages)
+        messages.append({'role': 'function', 'name': name, 'content': result})
+        results.append(result)
+    return results
+
+
+def scheduled_call_tool(scheduler, tools):
+    def call_tool(tool_name, tool_args, messages):
+        calls, index = current_step_calls(messages)
+        if index == 0:
+            scheduler.begin_step(calls, tools.call)
+        return scheduler.result(index, tool_name, tool_args, tools.call)
+    return call_tool
+
+
+def check_ordering(tool_names, results, timeline):
+    assert [json.loads(r)['tool'] for r in results] == tool_names, "results out of order"
+    writes = [entry for entry in timeline if entry[0] not in READ_ONLY_TOOLS]
+    for name, start, end in writes:
+        for other, other_start, other_end in timeline:
+            if (other, other_start) != (name, start):
+                assert other_end <= start or other_start >= end, f"{other} overlapped write {name}"
+    if writes:
+        first_write_start = min(start for _, start, _ in writes)
+        write_index = next(i for i, name in enumerate(tool_names) if name not in READ_ONLY_TOOLS)
+        for name in tool_names[write_index + 1:]:
+            assert all(start >= first_write_start for n, start, _ in timeline if n == name), f"{name} ran before the write"
+
+
+def main():
+    executor = ThreadPoolExecutor(max_workers=4)
+    print(f"{'step':<26} | {'sequential (s)':>14} | {'scheduled (s)':>13} | {'speed-up':>8}")
+    for label, tool_names in STEPS.items():
+        sequential_tools = StubTools()
+        start = time.perf_counter()
+        run_step(tool_names, lambda name, args, messages: sequential_tools.call(name, args))
+        sequential = time.perf_counter() - start
+
+        scheduled_tools = StubTools()
+        scheduler = ToolCallScheduler(READ_ONLY_TOOLS, executor)
+        start = time.perf_counter()
+        results = run_step(tool_names, scheduled_call_tool(scheduler, scheduled_tools))
+        scheduled = time.perf_counter() - start
+        check_ordering(tool_names, results, scheduled_tools.timeline)
+
+        print(f"{label:<26} | {sequential:>14.2f} | {scheduled:>13.2f} | {sequential / scheduled:>7.1f}x")
+    executor.shutdown()
+    print("\nResults arrived in call order; write calls never overlapped other calls.")
+
+
+if __name__ == '__main__':
+    main()
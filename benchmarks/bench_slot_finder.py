@@ -0,0 +1,117 @@
+# digital_twin_agent/benchmarks/bench_slot_finder.py
+
+"""
+Correctness and speed check for the busy-interval index behind calendar_slot_finder.
+It builds synthetic calendars with thousands of overlapping events. Every answer from
+BusyIndex is compared against a brute-force minute-by-minute scan, and the script
+reports how long it takes to build the index and to answer a query.
+
+Run from the project root:
+    python -m benchmarks.bench_slot_finder
+"""
+
+import random
+import time
+
+from core.busy_index import BusyIndex
+
+MINUTE = 60
+DAY = 24 * 60 * MINUTE
+DAYS = 365
+CHECKED_QUERIES = 200
+
+
+def synthetic_events(n: int, rng: random.Random) -> list[tuple[int, int]]:
+    """Random events of 15 minutes to 2 hours on 15-minute boundaries, some of them overlapping."""
+    events = []
+    for _ in range(n):
+        start = rng.randrange(0, DAYS * DAY // (15 * MINUTE)) * 15 * MINUTE
+        events.append((start, start + rng.randint(1, 8) * 15 * MINUTE))
+    return events
+
+
+def working_windows(first_day: int, last_day: int) -> list[tuple[int, int]]:
+    return [(day * DAY + 9 * 3600, day * DAY + 17 * 3600) for day in range(first_day, last_day + 1) if day % 7 < 5]
+
+
+def brute_force_slots(events, windows, duration, count, align):
+    """The reference answer: scans every aligned start minute by minute."""
+    busy = set()
+    for start, end in events:
+        busy.update(range(start // MINUTE, (end + MINUTE - 1) // MINUTE))
+    slots = []
+    for window_start, window_end in windows:
+        start = window_start
+        while start + duration <= window_end and len(slots) < count:
+            if all(minute not in busy for minute in range(start // MINUTE, (start + duration) // MINUTE)):
+                slots.append((start, start + duration))
+                # The next slot may start right where this one ends.
+                start += duration
+            else:
+                start += align
+        if len(slots) >= count:
+            break
+    return slots
+
+
+def check_index(rng: random.Random):
+    events = synthetic_events(3000, rng)
+    index = BusyIndex(events)
+    incremental = BusyIndex()
+    for start, end in events:
+        incremental.add(start, end)
+    assert index.intervals() == incremental.intervals(), "bulk and incremental merges disagree"
+
+    busy = set()
+    for start, end in events:
+        busy.update(range(start // MINUTE, end // MINUTE))
+    for _ in range(CHECKED_QUERIES):
+        start = rng.randrange(0, DAYS * DAY // MINUTE) * MINUTE
+        end = start + rng.randint(1, 240) * MINUTE
+        expected = all(minute not in busy for minute in range(start // MINUTE, end // MINUTE))
+        assert index.is_free(start, end) == expected, (start, end)
+
+    # A sparser calendar keeps the brute-force reference fast enough while leaving plenty of gaps.
+    sparse = synthetic_events(1500, rng)
+    sparse_index = BusyIndex(sparse)
+    for _ in range(CHECKED_QUERIES // 4):
+        first_day = rng.randrange(0, DAYS - 14)
+        windows = working_windows(first_day, first_day + rng.randint(0, 13))
+        duration = rng.choice((15, 30, 45, 60, 90)) * MINUTE
+        count = rng.randint(1, 8)
+        got = sparse_index.free_slots(0, DAYS * DAY, duration, count, windows=windows, align=15 * MINUTE)
+        want = brute_force_slots(sparse, windows, duration, count, 15 * MINUTE)
+        assert got == want, (got, want)
+    # A completely free working day holds many slots in a single gap.
+    day = working_windows(0, 0)
+    got = BusyIndex().free_slots(0, DAY, 30 * MINUTE, 3, windows=day, align=15 * MINUTE)
+    assert got == brute_force_slots([], day, 30 * MINUTE, 3, 15 * MINUTE) and len(got) == 3, got
+    print(f"Correctness: {len(index)} merged blocks from {len(events)} events; "
+          f"{CHECKED_QUERIES} conflict checks and {CHECKED_QUERIES // 4} slot searches match brute force.")
+
+
+def time_index(rng: random.Random):
+    print(f"\n{'events':>7} | {'build (ms)':>10} | {'query (us)':>10}")
+    for n in (1000, 5000, 20000):
+        events = synthetic_events(n, rng)
+        start = time.perf_counter()
+        index = BusyIndex(events)
+        build = time.perf_counter() - start
+
+        windows = working_windows(0, DAYS - 1)
+        queries = 500
+        start = time.perf_counter()
+        for _ in range(queries):
+            index.free_slots(0, DAYS * DAY, 30 * MINUTE, 5, windows=windows, align=15 * MINUTE)
+        query = (time.perf_counter() - start) / queries
+        print(f"{n:>7} | {build * 1000:>10.1f} | {query * 1e6:>10.1f}")
+
+
+def main():
+    rng = random.Random(7)
+    check_index(rng)
+    time_index(rng)
+
+
+if __name__ == '__main__':
+    main()
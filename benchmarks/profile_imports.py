@@ -0,0 +1,78 @@
+# digital_twin_agent/benchmarks/profile_imports.py
+
+"""
+Profiles the cold-start import of a module with `python -X importtime` and prints the
+total time and the slowest top-level imports. Use it to compare startup before and after
+a change, e.g. by running it once on each commit:
+
+    python -m benchmarks.profile_imports                 # profiles core.agent
+    python -m benchmarks.profile_imports api.main --top 25
+
+Each import runs in a fresh interpreter, so nothing is already cached in sys.modules.
+Runs are repeated and the median is reported, since the first run also warms the OS file cache.
+It also reports whether any module that should only load on first use (chromadb,
+sentence-transformers, the Google auth and discovery libraries) was imported eagerly.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that should only be imported once a tool is used or `warmup()` runs.
+DEFERRED_MODULES = ('chromadb', 'sentence_transformers', 'torch', 'google_auth_oauthlib', 'googleapiclient.discovery')
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def profile(module: str) -> tuple[float, list, set]:
+    """
+    Imports `module` in a fresh interpreter.
+
+    Returns:
+        tuple: The cumulative import time in seconds, the (cumulative_us, name) pairs of the
+            direct imports of `module`'s import tree, and the set of all modules imported.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    total = next(cumulative for cumulative, _, name in reversed(entries) if name == module)
+    # Importtime output lists children before their parent; depth is the indentation level.
+    target_depth = next(depth for _, depth, name in reversed(entries) if name == module)
+    children = [(cumulative, name) for cumulative, depth, name in entries if depth == target_depth + 2]
+    return total / 1e6, children, {name for _, _, name in entries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the cold-start import time of a module.")
+    parser.add_argument('module', nargs='?', default='core.agent')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [profile(args.module) for _ in range(args.runs)]
+    totals = [total for total, _, _ in runs]
+    print(f"import {args.module}: median {statistics.median(totals):.2f}s "
+          f"(min {min(totals):.2f}s, max {max(totals):.2f}s over {args.runs} runs)\n")
+
+    _, children, imported = runs[len(runs) // 2]
+    print("Slowest imports (cumulative, from one run):")
+    for cumulative, name in sorted(children, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+    loaded = [name for name in DEFERRED_MODULES if name in imported]
+    print(f"\nDeferred modules imported eagerly: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,43 +2,155 @@
 
 import os
 import datetime
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from qwen_agent.agents import Assistant
+from qwen_agent.llm import get_chat_model
 
 # --- Custom Tool Imports ---
 from tools.calendar_tools import GoogleCalendarTool
 from tools.email_tools import GmailTool
 from tools.style_retriever_tool import StyleRetrieverTool
 from tools.writer_tools import GmailSenderTool, CalendarCreatorTool
+from tools.scheduling_tools import CalendarSlotFinderTool
 from tools.content_retriever_tool import ContentRetrieverTool # Import new tool
+from core.agent_pool import AgentPool
+from core.auth import get_google_credentials, get_service
+from core.tool_scheduler import ToolCallScheduler, current_step_calls
 
 # --- Load Environment Variables ---
 load_dotenv()
 
+# --- Concurrency ---
+# The maximum number of conversations the agent serves at once. Each one runs on its own agent instance.
+MAX_CONCURRENT_AGENTS = int(os.getenv('MAX_CONCURRENT_AGENTS', '4'))
+# Whether the LLM may request several tools in one step; independent read-only calls then run concurrently.
+PARALLEL_TOOL_CALLS = os.getenv('PARALLEL_TOOL_CALLS', 'true').lower() == 'true'
+# Threads shared by all agents for running read-only tool calls concurrently.
+TOOL_CALL_WORKERS = int(os.getenv('TOOL_CALL_WORKERS', '4'))
+# Tools without side effects. Every other tool (the write tools) runs one call at a time, in order.
+READ_ONLY_TOOLS = frozenset({
+    'google_calendar_reader', 'calendar_slot_finder', 'gmail_reader', 'style_retriever', 'email_content_retriever'
+})
+
 # --- Configure the Language Model (LLM) ---
 llm_config = {
     'model_server': os.getenv('MODEL_STUDIO_URL'),
     'api_key': os.getenv('MODEL_STUDIO_API_KEY'),
     'model': 'qwen-max', 
-    'generate_cfg': {'top_p': 0.8}
+    'generate_cfg': {'top_p': 0.8, 'parallel_function_calls': PARALLEL_TOOL_CALLS}
 }
 
+# --- Context Window Budget ---
+# Estimated prompt tokens (system prompt plus history) sent to the LLM per call.
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))
+# The most recent user turns (with their tool calls and results) are always sent verbatim.
+KEEP_RECENT_TURNS = int(os.getenv('KEEP_RECENT_TURNS', '2'))
+# Tool results in older turns (e.g. retrieved email contents) are cut down to this many characters.
+OLD_TOOL_RESULT_CHARS = int(os.getenv('OLD_TOOL_RESULT_CHARS', '300'))
+
 # --- Define the BASE System Prompt ---
 # The instructions now include guidance on using the new content retrieval tool.
 system_prompt_template = (
     "You are a highly capable AI personal assistant, a 'Digital Twin'. "
     "Your primary goal is to learn from the user's data and communication style to assist them proactively. "
-    "You have access to read-only tools (`google_calendar_reader`, `gmail_reader`, `style_retriever`, `email_content_retriever`) "
+    "You have access to read-only tools (`google_calendar_reader`, `calendar_slot_finder`, `gmail_reader`, `style_retriever`, `email_content_retriever`) "
     "and write-action tools (`gmail_sender`, `calendar_event_creator`).\n"
     "GUIDELINES:\n"
-    "1. For questions about your inbox status, use `gmail_reader`.\n"
-    "2. For questions about the CONTENT of past emails (e.g., 'what did X say about Y'), use `email_content_retriever`.\n"
-    "3. To DRAFT an email, you MUST first use `style_retriever` to get style examples.\n"
-    "4. SAFETY: For any write-action tool, you MUST present your plan and ask 'Shall I proceed? [y/n]' before acting.\n\n"
+    "1. For questions about your inbox status, use `gmail_reader`. For questions spanning several days (e.g. 'this week'), call `google_calendar_reader` once with `start_date` and `end_date`.\n"
+    "2. For questions about the CONTENT of past emails (e.g., 'what did X say about Y'), use `email_content_retriever`. Narrow it with dates when the question mentions a time period.\n"
+    "3. To DRAFT an email, you MUST first use `style_retriever` to get style examples. Pass the recipient's address when you know it.\n"
+    "4. To propose a meeting time or before creating an event, use `calendar_slot_finder` to find conflict-free slots instead of guessing.\n"
+    "5. SAFETY: For any write-action tool, you MUST present your plan and ask 'Shall I proceed? [y/n]' before acting.\n\n"
     "Current date: {current_date}"
 )
+# Appended for unattended runs, whose agents are built without the write-action tools.
+READ_ONLY_PROMPT_NOTE = (
+    "\n\nThis session is READ-ONLY: the write-action tools are not available. "
+    "Describe any action as a suggestion for the user instead of trying to perform it."
+)
+
+# --- History Compaction ---
+# Per-turn prompt metrics for the most recent LLM calls, newest last.
+prompt_metrics = deque(maxlen=100)
+_metrics_lock = threading.Lock()
+
+def count_tokens(text: str) -> int:
+    # The Qwen tokenizer loads its vocabulary when imported, so it is imported on first use.
+    from qwen_agent.utils.tokenization_qwen import count_tokens as qwen_count_tokens
+    return qwen_count_tokens(text)
+
+def _message_tokens(message: dict) -> int:
+    tokens = count_tokens(str(message.get('content') or ''))
+    function_call = message.get('function_call')
+    if function_call:
+        tokens += count_tokens(f"{function_call.get('name', '')} {function_call.get('arguments', '')}")
+    return tokens
+
+def estimate_tokens(messages: list, system_prompt: str = '') -> int:
+    """Estimates the prompt tokens of a system prompt plus a message list with the Qwen tokenizer."""
+    return (count_tokens(system_prompt) if system_prompt else 0) + sum(_message_tokens(m) for m in messages)
+
+def compact_history(messages: list, system_prompt: str = '', budget: int = PROMPT_TOKEN_BUDGET,
+                    keep_recent_turns: int = KEEP_RECENT_TURNS, tool_result_chars: int = OLD_TOOL_RESULT_CHARS) -> tuple:
+    """
+    Shrinks a conversation to fit the prompt budget before it is sent to the LLM.
+    The last `keep_recent_turns` user turns (at least the current one) are kept verbatim. Tool results in older turns are truncated,
+    and if the prompt is still over budget, the oldest turns are dropped whole.
+
+    Returns:
+        tuple: The compacted message list and a metrics dict with token and message counts before and after.
+    """
+    system_tokens = count_tokens(system_prompt) if system_prompt else 0
+    message_tokens = [_message_tokens(m) for m in messages]
+    tokens_before = system_tokens + sum(message_tokens)
+    metrics = {
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_before,
+        'messages_before': len(messages),
+        'messages_after': len(messages),
+        'tool_results_truncated': 0,
+        'budget': budget
+    }
+    if tokens_before <= budget:
+        return list(messages), metrics
+
+    user_turn_starts = [i for i, message in enumerate(messages) if message.get('role') == 'user']
+    # The current turn is always kept, so 0 compacts everything before it.
+    keep_turns = max(keep_recent_turns, 1)
+    recent_start = user_turn_starts[-keep_turns] if len(user_turn_starts) >= keep_turns else 0
+    older = list(messages[:recent_start])
+    older_tokens = message_tokens[:recent_start]
+    recent_tokens = sum(message_tokens[recent_start:])
+
+    for i, message in enumerate(older):
+        content = message.get('content')
+        if message.get('role') == 'function' and isinstance(content, str) and len(content) > tool_result_chars:
+            older[i] = {**message, 'content': f"{content[:tool_result_chars]}... [truncated {len(content) - tool_result_chars} characters]"}
+            older_tokens[i] = _message_tokens(older[i])
+            metrics['tool_results_truncated'] += 1
+
+    # Drop whole turns, oldest first, so the history still starts with a user message.
+    while older and system_tokens + sum(older_tokens) + recent_tokens > budget:
+        next_turn = next((i for i, message in enumerate(older) if i > 0 and message.get('role') == 'user'), len(older))
+        older, older_tokens = older[next_turn:], older_tokens[next_turn:]
+
+    compacted = older + list(messages[recent_start:])
+    metrics['tokens_after'] = system_tokens + sum(older_tokens) + recent_tokens
+    metrics['messages_after'] = len(compacted)
+    return compacted, metrics
+
+def get_prompt_metrics() -> list:
+    """Returns the prompt metrics recorded for recent turns, oldest first."""
+    with _metrics_lock:
+        return list(prompt_metrics)
 
 # --- Initialize Tools ---
+# Constructing the tools is cheap: credentials, API clients, vector stores and the embedding model
+# are all loaded on first use (or ahead of time by `warmup`).
 print("Initializing tools...")
 calendar_tool = GoogleCalendarTool()
 gmail_tool = GmailTool()
@@ -46,23 +158,110 @@ style_tool = StyleRetrieverTool()
 content_tool = ContentRetrieverTool() # Create instance of new tool
 gmail_sender_tool = GmailSenderTool()
 calendar_creator_tool = CalendarCreatorTool()
+slot_finder_tool = CalendarSlotFinderTool()
 print("Tools initialized successfully.")
 
-# --- Initialize the Assistant Agent ---
-digital_twin = Assistant(
-    llm=llm_config,
-    function_list=[
-        calendar_tool, gmail_tool, style_tool, content_tool,
-        gmail_sender_tool, calendar_creator_tool
-    ] 
-)
+# --- Shared Agent Components ---
+# The LLM client and the tool instances are built once and shared by every agent instance.
+# Agents themselves hold per-run state (the system prompt), so each request gets its own.
+shared_llm = get_chat_model(llm_config)
+shared_tools = [
+    calendar_tool, slot_finder_tool, gmail_tool, style_tool, content_tool,
+    gmail_sender_tool, calendar_creator_tool
+]
+# Unattended runs (the proactive daemon) get agents that cannot send mail or create events at all.
+read_only_tools = [tool for tool in shared_tools if tool.name in READ_ONLY_TOOLS]
+
+tool_call_executor = ThreadPoolExecutor(max_workers=TOOL_CALL_WORKERS, thread_name_prefix='tool-call')
+
+class DigitalTwinAssistant(Assistant):
+    """
+    An Assistant that runs the independent read-only tool calls of one LLM step concurrently.
+    qwen-agent executes a step's calls one by one; this hooks the first of them to start the rest early.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tool_scheduler = ToolCallScheduler(READ_ONLY_TOOLS, tool_call_executor)
+
+    def _call_tool(self, tool_name: str, tool_args='{}', **kwargs):
+        def run_tool(name, args):
+            return super(DigitalTwinAssistant, self)._call_tool(name, args, **kwargs)
+
+        calls, index = current_step_calls(kwargs.get('messages') or [])
+        if index == 0:
+            # Prefetched calls get a snapshot of the history; the agent keeps appending to its own list.
+            snapshot = {**kwargs, 'messages': list(kwargs.get('messages') or [])}
+            self.tool_scheduler.begin_step(
+                calls, lambda name, args: super(DigitalTwinAssistant, self)._call_tool(name, args, **snapshot)
+            )
+        return self.tool_scheduler.result(index, tool_name, tool_args, run_tool)
+
+def create_agent() -> Assistant:
+    """Builds a new agent on top of the shared LLM client and tools. This is cheap."""
+    return DigitalTwinAssistant(llm=shared_llm, function_list=shared_tools)
+
+def create_read_only_agent() -> Assistant:
+    """Builds a new agent that only has the read-only tools."""
+    return DigitalTwinAssistant(llm=shared_llm, function_list=read_only_tools)
+
+agent_pool = AgentPool(create_agent, max_size=MAX_CONCURRENT_AGENTS)
+read_only_agent_pool = AgentPool(create_read_only_agent, max_size=MAX_CONCURRENT_AGENTS)
+
+_warmup_lock = threading.Lock()
+_warm = False
+
+def warmup():
+    """
+    Loads everything the tools otherwise load on first use: Google credentials and API clients,
+    the vector store collections, the embedding model and the tokenizer. Safe to call more than once.
+    A server can run this in the background so the first request does not pay for it.
+    """
+    global _warm
+    with _warmup_lock:
+        if _warm:
+            return
+        start = time.monotonic()
+        get_google_credentials()
+        get_service('gmail', 'v1')
+        get_service('calendar', 'v3')
+        style_tool.vector_store.count()
+        content_tool.vector_store.count()
+        style_tool.vector_store.embedder.model
+        count_tokens('')
+        _warm = True
+        print(f"Warm-up complete in {time.monotonic() - start:.1f}s.")
+
+def is_warm() -> bool:
+    """Returns True once `warmup` has finished."""
+    return _warm
+
+def run_agent_with_dynamic_prompt(messages: list, read_only: bool = False):
+    """
+    Runs the conversation on an agent of its own, with the current date injected into the system prompt.
+    The history is compacted to the prompt token budget first; the caller's list is not modified.
+    The agent is returned to the pool once the response stream is exhausted or closed.
+
+    Args:
+        messages (list): The conversation so far.
+        read_only (bool): Whether to run on an agent without the write-action tools, for runs with no
+            user in the loop to confirm an action.
 
-def run_agent_with_dynamic_prompt(messages: list) -> list:
-    """Injects the current date into the system prompt before running the agent."""
+    Yields:
+        list: The agent's incremental response messages.
+    """
     today_str = datetime.date.today().strftime('%Y-%m-%d')
     dynamic_system_prompt = system_prompt_template.format(current_date=today_str)
-    digital_twin.system_message = dynamic_system_prompt
-    return digital_twin.run(messages=messages)
+    if read_only:
+        dynamic_system_prompt += READ_ONLY_PROMPT_NOTE
+    compacted_messages, metrics = compact_history(messages, system_prompt=dynamic_system_prompt)
+    metrics['timestamp'] = datetime.datetime.now().isoformat(timespec='seconds')
+    with _metrics_lock:
+        prompt_metrics.append(metrics)
+    print(f"Prompt: ~{metrics['tokens_after']} tokens ({metrics['messages_after']} messages), "
+          f"compacted from ~{metrics['tokens_before']} tokens ({metrics['messages_before']} messages).")
+    with (read_only_agent_pool if read_only else agent_pool).acquire() as agent:
+        agent.system_message = dynamic_system_prompt
+        yield from agent.run(messages=compacted_messages)
 
 # This file is now primarily a library. The main execution points are app.py and run_proactive_assistant.py.
 if __name__ == '__main__':
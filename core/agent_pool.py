@@ -0,0 +1,62 @@
+# digital_twin_agent/core/agent_pool.py
+
+import queue
+import threading
+from contextlib import contextmanager
+
+class AgentPool:
+    """
+    Hands out agent instances so that each request runs on an agent nobody else is using.
+    Agents are created on demand by a factory, reused once released, and at most `max_size`
+    are in use at any time; further callers wait for one to be released.
+    """
+    def __init__(self, factory, max_size: int):
+        """
+        Args:
+            factory (callable): Builds a new agent. It should share heavy, immutable parts
+                (tools, LLM client) between the agents it creates.
+            max_size (int): The maximum number of agents in use at once.
+        """
+        self.max_size = max_size
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+
+    @contextmanager
+    def acquire(self, timeout: float = None):
+        """
+        Checks an agent out of the pool for the duration of a `with` block.
+
+        Args:
+            timeout (float): Seconds to wait for a free agent. None waits indefinitely.
+
+        Raises:
+            TimeoutError: If no agent became free within `timeout`.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No agent became available within {timeout} seconds.")
+        try:
+            try:
+                agent = self._idle.get_nowait()
+            except queue.Empty:
+                agent = self._factory()
+                with self._lock:
+                    self.created += 1
+            with self._lock:
+                self.in_use += 1
+            try:
+                yield agent
+            finally:
+                with self._lock:
+                    self.in_use -= 1
+                self._idle.put(agent)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Returns how many agents exist and how many are currently checked out."""
+        with self._lock:
+            return {'max_size': self.max_size, 'created': self.created, 'in_use': self.in_use}
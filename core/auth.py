@@ -1,11 +1,9 @@
 # digital_twin_agent/core/auth.py
 
+import datetime
 import os.path
 import pickle
-
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import threading
 
 # Define the SCOPES. If you modify them, delete the token.json file.
 # These grant full access to calendar and mail.
@@ -17,6 +15,97 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CREDENTIALS_PATH = os.path.join(BASE_DIR, 'credentials.json')
 TOKEN_PATH = os.path.join(BASE_DIR, 'token.pickle') # Changed to .pickle for clarity
 
+# --- Credentials Manager ---
+# Access tokens are refreshed this long before they expire, so no request goes out with a token about to lapse.
+REFRESH_MARGIN_SECONDS = 300
+
+class CredentialsManager:
+    """
+    Loads the user's Google credentials once per process and shares them between all tools.
+    Tokens are refreshed under a lock shortly before they expire, and saved atomically.
+    """
+    def __init__(self, token_path: str = TOKEN_PATH, credentials_path: str = CREDENTIALS_PATH, scopes=SCOPES):
+        """
+        Args:
+            token_path (str): The pickle file holding the user's access and refresh tokens.
+            credentials_path (str): The OAuth client secrets downloaded from the Google Cloud Console.
+            scopes (list[str]): The OAuth scopes to request.
+        """
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+        self._creds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns valid credentials, loading, refreshing or (on first use) authorizing them as needed.
+
+        Returns:
+            google.oauth2.credentials.Credentials: The authorized credentials object.
+        """
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load()
+            elif self._needs_refresh(self._creds):
+                from google.auth.transport.requests import Request
+                print("Refreshing credentials before they expire...")
+                self._creds.refresh(Request())
+                self._save(self._creds)
+            return self._creds
+
+    def _load(self):
+        # The Google auth libraries are imported on first use, keeping them off the import path of core.agent.
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds = None
+        # The file token.pickle stores the user's access and refresh tokens.
+        # It is created automatically when the authorization flow completes for the first time.
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+
+        # If there are no (valid) credentials available, let the user log in.
+        if not creds or self._needs_refresh(creds):
+            if creds and creds.refresh_token:
+                print("Refreshing expired credentials...")
+                creds.refresh(Request())
+            else:
+                print("Initiating new user authentication...")
+                if not os.path.exists(self.credentials_path):
+                    raise FileNotFoundError(
+                        "Error: `credentials.json` not found. "
+                        "Please download it from the Google Cloud Console and place it in the project's root directory."
+                    )
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+                creds = flow.run_local_server(port=0)
+            self._save(creds)
+
+        print("Google API credentials obtained successfully.")
+        return creds
+
+    def _needs_refresh(self, creds) -> bool:
+        if not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth keeps `expiry` as a naive UTC datetime.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < datetime.timedelta(seconds=REFRESH_MARGIN_SECONDS)
+
+    def _save(self, creds):
+        """Writes the token file atomically, so a crash mid-write never leaves a corrupt file behind."""
+        tmp_path = f'{self.token_path}.tmp'
+        with open(tmp_path, 'wb') as token:
+            print("Saving credentials to token.pickle...")
+            pickle.dump(creds, token)
+            token.flush()
+            os.fsync(token.fileno())
+        os.replace(tmp_path, self.token_path)
+
+credentials_manager = CredentialsManager()
+
 def get_google_credentials():
     """
     Handles the user authentication flow for Google APIs.
@@ -24,40 +113,38 @@ def get_google_credentials():
     - If credentials are not found or are invalid, it initiates the
       OAuth 2.0 flow, prompting the user for consent via their browser.
     - Saves the new credentials to token.pickle for future runs.
+
+    The credentials are loaded once per process and refreshed before they expire.
     
     Returns:
         google.oauth2.credentials.Credentials: The authorized credentials object.
     """
-    creds = None
-    # The file token.pickle stores the user's access and refresh tokens.
-    # It is created automatically when the authorization flow completes for the first time.
-    if os.path.exists(TOKEN_PATH):
-        with open(TOKEN_PATH, 'rb') as token:
-            creds = pickle.load(token)
-
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            print("Refreshing expired credentials...")
-            creds.refresh(Request())
-        else:
-            print("Initiating new user authentication...")
-            if not os.path.exists(CREDENTIALS_PATH):
-                raise FileNotFoundError(
-                    "Error: `credentials.json` not found. "
-                    "Please download it from the Google Cloud Console and place it in the project's root directory."
-                )
-            flow = InstalledAppFlow.from_client_secrets_file(
-                CREDENTIALS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        # Save the credentials for the next run
-        with open(TOKEN_PATH, 'wb') as token:
-            print("Saving credentials to token.pickle...")
-            pickle.dump(creds, token)
-            
-    print("Google API credentials obtained successfully.")
-    return creds
+    return credentials_manager.get()
+
+# --- Per-thread API Clients ---
+# googleapiclient service objects share one httplib2 connection, which is not thread-safe.
+# Tools are shared by concurrent agents, so each thread gets its own client per API.
+_thread_clients = threading.local()
+
+def get_service(api_name: str, api_version: str):
+    """
+    Returns a Google API client for the calling thread, building it on first use.
+    Clients are built from the discovery documents bundled with google-api-python-client,
+    so no discovery request is made at runtime.
+
+    Args:
+        api_name (str): The API name, e.g. 'gmail' or 'calendar'.
+        api_version (str): The API version, e.g. 'v1' or 'v3'.
+    """
+    # Called on every use, so tokens are refreshed ahead of expiry even in long-running processes.
+    credentials = get_google_credentials()
+    clients = _thread_clients.__dict__.setdefault('clients', {})
+    key = (api_name, api_version, id(credentials))
+    if key not in clients:
+        from googleapiclient.discovery import build
+        clients[key] = build(api_name, api_version, credentials=credentials,
+                             static_discovery=True, cache_discovery=False)
+    return clients[key]
 
 if __name__ == '__main__':
     # This block is for testing the authentication flow directly.
@@ -0,0 +1,119 @@
+# digital_twin_agent/core/busy_index.py
+
+import bisect
+import math
+
+class BusyIndex:
+    """
+    An index of busy time, kept as sorted, non-overlapping intervals of epoch seconds.
+
+    Overlapping and touching blocks are merged when added, so a free-slot search only walks the gaps
+    between merged blocks, and the blocks around any instant are found by binary search.
+    """
+    def __init__(self, intervals=()):
+        """
+        Args:
+            intervals (iterable): Busy (start, end) pairs in epoch seconds, in any order.
+        """
+        self._starts = []
+        self._ends = []
+        self.add_many(intervals)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def intervals(self) -> list[tuple[float, float]]:
+        """Returns the merged busy intervals in order."""
+        return list(zip(self._starts, self._ends))
+
+    def add_many(self, intervals):
+        """Adds busy intervals in bulk with one sort-and-merge pass. Empty intervals are ignored."""
+        pending = sorted((start, end) for start, end in intervals if end > start)
+        if not pending:
+            return
+        merged = []
+        for start, end in _merge_sorted(self.intervals(), pending):
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+
+    def add(self, start: float, end: float):
+        """Adds one busy interval, merging it with the blocks it overlaps or touches."""
+        if end <= start:
+            return
+        # Blocks [lo, hi) are the ones that overlap or touch the new interval.
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def is_free(self, start: float, end: float) -> bool:
+        """Returns True if no busy block overlaps [start, end)."""
+        i = bisect.bisect_right(self._ends, start)
+        return i == len(self._starts) or self._starts[i] >= end
+
+    def free_slots(self, range_start: float, range_end: float, duration: float, count: int,
+                   windows=None, align: float = 0) -> list[tuple[float, float]]:
+        """
+        Finds the earliest free slots of `duration` seconds, until `count` are found. A free gap
+        long enough for several slots yields them back to back.
+
+        Args:
+            range_start (float): The start of the search range, in epoch seconds.
+            range_end (float): The end of the search range, in epoch seconds.
+            duration (float): The slot length in seconds.
+            count (int): The maximum number of slots to return.
+            windows (iterable): Optional sorted (start, end) windows the slots must fall within,
+                e.g. working hours on each day. Defaults to the whole range.
+            align (float): If set, slot starts are rounded up to a multiple of this many seconds.
+
+        Returns:
+            list[tuple[float, float]]: Up to `count` (start, end) slots, in time order.
+        """
+        slots = []
+        for window_start, window_end in windows if windows is not None else [(range_start, range_end)]:
+            window_start, window_end = max(window_start, range_start), min(window_end, range_end)
+            if window_end - window_start < duration:
+                continue
+            cursor = window_start
+            # The first block that ends after the window starts; blocks before it cannot matter.
+            i = bisect.bisect_right(self._ends, cursor)
+            while len(slots) < count:
+                gap_end = min(self._starts[i], window_end) if i < len(self._starts) else window_end
+                start = _align_up(cursor, align)
+                if start + duration <= gap_end:
+                    slots.append((start, start + duration))
+                    # Keep filling the same gap after this slot.
+                    cursor = start + duration
+                    continue
+                if i >= len(self._starts) or self._starts[i] >= window_end:
+                    break
+                cursor = max(cursor, self._ends[i])
+                i += 1
+            if len(slots) >= count:
+                break
+        return slots
+
+
+def _merge_sorted(left: list, right: list):
+    """Yields the items of two sorted lists in sorted order."""
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] <= right[j]:
+            yield left[i]
+            i += 1
+        else:
+            yield right[j]
+            j += 1
+    yield from left[i:]
+    yield from right[j:]
+
+def _align_up(value: float, align: float) -> float:
+    return math.ceil(value / align) * align if align else value
@@ -0,0 +1,264 @@
+# digital_twin_agent/core/calendar_cache.py
+
+import datetime
+import os
+import threading
+import time
+
+import dateutil.parser
+from googleapiclient.errors import HttpError
+
+# --- Calendar Cache Settings ---
+# The calendar's sync token is checked for changes at most this often. Between checks, cached days are
+# served as-is, so this bounds how long a change made elsewhere (e.g. on a phone) can go unnoticed.
+CALENDAR_SYNC_INTERVAL_SECONDS = float(os.getenv('CALENDAR_SYNC_INTERVAL_SECONDS', '30'))
+# A cached day is re-fetched after this long regardless of what the sync token reports.
+CALENDAR_MAX_STALENESS_SECONDS = float(os.getenv('CALENDAR_MAX_STALENESS_SECONDS', '900'))
+# events.list page size; 2500 is the API maximum.
+EVENTS_PAGE_SIZE = 2500
+
+
+def event_days(event: dict) -> list[datetime.date]:
+    """
+    Returns the days an event occupies. Days are UTC days, matching the time windows the
+    cache queries, except for all-day events, which carry their own dates.
+    """
+    start, end = event.get('start', {}), event.get('end', {})
+    if 'date' in start:
+        first = datetime.date.fromisoformat(start['date'])
+        # All-day events end on the (exclusive) day after their last day.
+        last = datetime.date.fromisoformat(end['date']) - datetime.timedelta(days=1) if 'date' in end else first
+    elif 'dateTime' in start:
+        start_time = dateutil.parser.isoparse(start['dateTime']).astimezone(datetime.timezone.utc)
+        end_time = dateutil.parser.isoparse(end['dateTime']).astimezone(datetime.timezone.utc) if 'dateTime' in end else start_time
+        first = start_time.date()
+        # An event ending exactly at midnight does not occupy the next day.
+        last = (end_time - datetime.timedelta(microseconds=1)).date() if end_time > start_time else first
+    else:
+        return []
+    return [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def event_sort_key(event: dict) -> datetime.datetime:
+    """Orders events by start time across time zones; all-day events sort at the start of their day (UTC)."""
+    start = event.get('start', {})
+    if 'dateTime' in start:
+        return dateutil.parser.isoparse(start['dateTime']).astimezone(datetime.timezone.utc)
+    day = datetime.date.fromisoformat(start['date']) if 'date' in start else datetime.date.min
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+
+
+def list_events(service, calendar_id: str, time_min: str, time_max: str) -> list[dict]:
+    """Fetches every event in a time range, following pagination."""
+    events = []
+    page_token = None
+    while True:
+        response = service.events().list(
+            calendarId=calendar_id, timeMin=time_min, timeMax=time_max, singleEvents=True,
+            orderBy='startTime', maxResults=EVENTS_PAGE_SIZE, pageToken=page_token
+        ).execute()
+        events.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+def list_changes(service, calendar_id: str, sync_token: str = None) -> tuple[list[dict], str]:
+    """
+    Reads a calendar's change feed from a sync token, following pagination. Without a sync token
+    this pages through the calendar once, asking only for event IDs, to obtain the first token.
+
+    Returns:
+        tuple[list[dict], str]: The events changed (or deleted) since the token, and the next sync token.
+
+    Raises:
+        HttpError: 410 if the sync token has expired.
+    """
+    changes = []
+    page_token = None
+    while True:
+        request_args = {'calendarId': calendar_id, 'maxResults': EVENTS_PAGE_SIZE, 'pageToken': page_token}
+        if sync_token:
+            request_args.update(syncToken=sync_token, showDeleted=True)
+        else:
+            request_args['fields'] = 'items(id),nextPageToken,nextSyncToken'
+        response = service.events().list(**request_args).execute()
+        if sync_token:
+            changes.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return changes, response.get('nextSyncToken')
+
+
+class CalendarEventCache:
+    """
+    A read-through cache of one calendar's events, grouped by day.
+
+    Cached days are invalidated incrementally: the calendar's change feed is polled with a Calendar
+    API sync token, and only the days touched by changed events are dropped. Events created through
+    the assistant are written through with `add_event`, so they show up immediately.
+    """
+    def __init__(self, calendar_id: str = 'primary', sync_interval: float = CALENDAR_SYNC_INTERVAL_SECONDS,
+                 max_staleness: float = CALENDAR_MAX_STALENESS_SECONDS):
+        """
+        Args:
+            calendar_id (str): The calendar to cache.
+            sync_interval (float): Minimum seconds between change-feed checks.
+            max_staleness (float): Seconds after which a cached day is fetched again regardless.
+        """
+        self.calendar_id = calendar_id
+        self.sync_interval = sync_interval
+        self.max_staleness = max_staleness
+        self.hits = 0
+        self.misses = 0
+        self._days = {}
+        self._event_days = {}
+        self._sync_token = None
+        self._last_sync = 0.0
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+
+    def get_day(self, service, day: datetime.date) -> list[dict]:
+        """
+        Returns the events on a day, from memory when possible.
+
+        Args:
+            service: A Calendar API service object owned by the calling thread.
+            day (datetime.date): The day to look up.
+        """
+        return self.get_range(service, day, day)
+
+    def get_range(self, service, first_day: datetime.date, last_day: datetime.date) -> list[dict]:
+        """
+        Returns the events between two days (inclusive), sorted by start time. Days missing from
+        the cache are fetched with a single paginated query and cached individually.
+
+        Args:
+            service: A Calendar API service object owned by the calling thread.
+            first_day (datetime.date): The first day of the range.
+            last_day (datetime.date): The last day of the range.
+        """
+        self.sync(service)
+        days = [first_day + datetime.timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+        by_day = {}
+        missing = []
+        with self._lock:
+            now = time.monotonic()
+            for day in days:
+                entry = self._days.get(day)
+                if entry is not None and now - entry[1] <= self.max_staleness:
+                    by_day[day] = entry[0]
+                else:
+                    missing.append(day)
+            self.hits += len(days) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # One query spanning the first to the last missing day; cached days in between are simply refreshed.
+            first_missing, last_missing = missing[0], missing[-1]
+            time_min = datetime.datetime.combine(first_missing, datetime.time.min).isoformat() + 'Z'
+            time_max = datetime.datetime.combine(last_missing, datetime.time.max).isoformat() + 'Z'
+            events = list_events(service, self.calendar_id, time_min, time_max)
+            buckets = {day: [] for day in days if first_missing <= day <= last_missing}
+            for event in events:
+                for day in event_days(event):
+                    if day in buckets:
+                        buckets[day].append(event)
+            for day, day_events in buckets.items():
+                self._store_day(day, day_events)
+                by_day[day] = day_events
+
+        # Events spanning several days are cached under each of them but returned once.
+        merged = {}
+        for day in days:
+            for event in by_day[day]:
+                merged.setdefault(event['id'], event)
+        return sorted(merged.values(), key=event_sort_key)
+
+    def add_event(self, event: dict):
+        """Writes a newly created event through to any cached days it falls on."""
+        with self._lock:
+            for day in event_days(event):
+                self._event_days.setdefault(event['id'], set()).add(day)
+                entry = self._days.get(day)
+                if entry is not None:
+                    events = [e for e in entry[0] if e.get('id') != event['id']] + [event]
+                    events.sort(key=event_sort_key)
+                    self._days[day] = (events, entry[1])
+
+    def sync(self, service, force: bool = False) -> list[dict]:
+        """
+        Checks the calendar's change feed and invalidates the cached days that changed.
+        Does nothing if the last check was less than `sync_interval` seconds ago, unless `force` is set.
+
+        Returns:
+            list[dict]: The changed (or deleted) events reported since the previous check.
+        """
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return []
+        # Only one thread polls the change feed; the others keep serving cached days meanwhile.
+        if not self._sync_lock.acquire(blocking=False):
+            return []
+        try:
+            if self._sync_token is None:
+                # The first call only establishes a sync token; nothing is cached yet to invalidate.
+                self._sync_token = list_changes(service, self.calendar_id)[1]
+                self._last_sync = time.monotonic()
+                return []
+            try:
+                changes, self._sync_token = list_changes(service, self.calendar_id, self._sync_token)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                # The token expired: start over from an empty cache and a fresh token.
+                print("Calendar sync token expired; clearing the calendar cache.")
+                with self._lock:
+                    self._days.clear()
+                    self._event_days.clear()
+                self._sync_token = list_changes(service, self.calendar_id)[1]
+                changes = []
+            self._last_sync = time.monotonic()
+            self.invalidate(changes)
+            return changes
+        finally:
+            self._sync_lock.release()
+
+    def invalidate(self, changes: list[dict]):
+        """Drops the cached days touched by changed events, e.g. ones found through another change feed."""
+        with self._lock:
+            for event in changes:
+                # Recurring series can move many instances at once, so any change to one drops every cached day.
+                if event.get('recurrence') or event.get('recurringEventId'):
+                    self._days.clear()
+                    self._event_days.clear()
+                    return
+                days = self._event_days.pop(event['id'], set()) | set(event_days(event))
+                for day in days:
+                    self._days.pop(day, None)
+
+
+    def stats(self) -> dict:
+        """Returns day-lookup hit/miss counters and the number of cached days."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0, 'cached_days': len(self._days)}
+
+    def _store_day(self, day: datetime.date, events: list[dict]):
+        with self._lock:
+            self._days[day] = (list(events), time.monotonic())
+            for event in events:
+                self._event_days.setdefault(event['id'], set()).add(day)
+
+
+# --- Process-wide Registry ---
+# The calendar reader and the event creator share one cache per calendar, so writes show up in reads.
+_registry_lock = threading.Lock()
+_caches = {}
+
+def get_calendar_cache(calendar_id: str = 'primary') -> CalendarEventCache:
+    """Returns the shared event cache for a calendar."""
+    with _registry_lock:
+        if calendar_id not in _caches:
+            _caches[calendar_id] = CalendarEventCache(calendar_id)
+        return _caches[calendar_id]
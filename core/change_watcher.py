@@ -0,0 +1,133 @@
+# digital_twin_agent/core/change_watcher.py
+
+import collections
+import datetime
+import threading
+import time
+
+import dateutil.parser
+from googleapiclient.errors import HttpError
+
+from core.calendar_cache import get_calendar_cache, list_changes
+from tools.email_tools import fetch_message_metadata, message_ids_since
+
+class MailboxWatcher:
+    """
+    Detects new inbox mail cheaply by polling the Gmail history API from the last seen historyId.
+    A poll with no new mail costs a single small request.
+    """
+    def __init__(self, gmail_tool, label_ids=('INBOX',)):
+        """
+        Args:
+            gmail_tool (GmailTool): Supplies the (warm) Gmail API client.
+            label_ids (tuple[str]): The labels whose new messages are reported.
+        """
+        self.gmail_tool = gmail_tool
+        self.label_ids = tuple(label_ids)
+        self.history_id = None
+
+    def poll(self) -> list[dict]:
+        """
+        Returns the messages that arrived since the previous poll, as dicts with 'id', 'sender' and 'subject'.
+        The first poll only records the current history position.
+        """
+        service = self.gmail_tool.service
+        if self.history_id is None:
+            self.history_id = service.users().getProfile(userId='me').execute()['historyId']
+            return []
+        try:
+            message_ids, self.history_id = message_ids_since(service, self.history_id, self.label_ids)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            print("Mailbox history position expired; watching for new mail from now on.")
+            self.history_id = service.users().getProfile(userId='me').execute()['historyId']
+            return []
+        return [{
+            'id': metadata['id'],
+            'sender': metadata.get('From', 'Unknown Sender').split('<')[0].strip(),
+            'subject': metadata.get('Subject', 'No Subject')
+        } for metadata in fetch_message_metadata(service, message_ids)]
+
+
+class CalendarWatcher:
+    """
+    Detects changed calendar events with its own Calendar API sync token per calendar.
+
+    The calendar caches read the same change feed, but a change reaches only whichever reader syncs
+    first, so the watcher keeps a separate position and sees every change. The changes it finds are
+    passed on to the caches, so the analysis that follows reads current days.
+    """
+    def __init__(self, calendar_tool):
+        """
+        Args:
+            calendar_tool (GoogleCalendarTool): Supplies the (warm) Calendar API client and the calendar IDs.
+        """
+        self.calendar_tool = calendar_tool
+        self.sync_tokens = {}
+
+    def poll(self) -> list[dict]:
+        """
+        Returns the events created, changed or cancelled since the previous poll, skipping events
+        that have already ended. The first poll only records each calendar's sync token.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        changes = []
+        for calendar_id in self.calendar_tool.calendar_ids:
+            for event in self._changed_events(calendar_id):
+                end = event.get('end', {})
+                if 'dateTime' in end and dateutil.parser.isoparse(end['dateTime']) < now:
+                    continue
+                if 'date' in end and datetime.date.fromisoformat(end['date']) <= now.date():
+                    continue
+                changes.append({**event, 'calendar_id': calendar_id})
+        return changes
+
+    def _changed_events(self, calendar_id: str) -> list[dict]:
+        service = self.calendar_tool.service
+        sync_token = self.sync_tokens.get(calendar_id)
+        if sync_token is None:
+            self.sync_tokens[calendar_id] = list_changes(service, calendar_id)[1]
+            return []
+        try:
+            events, self.sync_tokens[calendar_id] = list_changes(service, calendar_id, sync_token)
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            print(f"Calendar sync token for '{calendar_id}' expired; watching for changes from now on.")
+            self.sync_tokens[calendar_id] = list_changes(service, calendar_id)[1]
+            return []
+        get_calendar_cache(calendar_id).invalidate(events)
+        return events
+
+
+class CallBudget:
+    """A sliding-window limit on how many calls may be made per period, e.g. LLM calls per hour."""
+    def __init__(self, max_calls: int, period: float = 3600):
+        """
+        Args:
+            max_calls (int): The number of calls allowed within any `period`.
+            period (float): The window length in seconds.
+        """
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = collections.deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Records a call and returns True if the budget allows it; returns False otherwise."""
+        with self._lock:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= self.period:
+                self._calls.popleft()
+            if len(self._calls) >= self.max_calls:
+                return False
+            self._calls.append(now)
+            return True
+
+    def seconds_until_available(self) -> float:
+        """Returns how long until the next call would be allowed."""
+        with self._lock:
+            if len(self._calls) < self.max_calls:
+                return 0.0
+            return max(0.0, self.period - (time.monotonic() - self._calls[0]))
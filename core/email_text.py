@@ -0,0 +1,184 @@
+# digital_twin_agent/core/email_text.py
+
+import base64
+import binascii
+import re
+from html.parser import HTMLParser
+
+# --- Reply and Signature Markers ---
+# Every pattern is matched against one line at a time, so no pattern can scan past a line break.
+# Gmail/Apple Mail: "On Tue, 4 Jun 2024 at 10:12, Alice <alice@example.com> wrote:", often wrapped over two lines.
+_REPLY_HEADER = re.compile(
+    r'^(?:On\s.{0,400}?\swrote|Le\s.{0,400}?\sa écrit|Am\s.{0,400}?\sschrieb|El\s.{0,400}?\sescribió)\s?:\s*$'
+)
+_ORIGINAL_MESSAGE = re.compile(r'^-{2,}\s*Original Message\s*-{2,}\s*$', re.IGNORECASE)
+# Outlook puts a header block ("From: ...", then "Sent: ..." or "Date: ...") above the quoted message,
+# sometimes after a line of underscores.
+_OUTLOOK_FROM = re.compile(r'^\*?From:\*?\s')
+_OUTLOOK_SENT = re.compile(r'^\*?(?:Sent|Date):\*?\s')
+_OUTLOOK_RULE = re.compile(r'^_{10,}\s*$')
+_SIGNATURE_DELIMITER = re.compile(r'^--\s*$')
+_MOBILE_SIGNATURE = re.compile(r'^(?:Sent from my\s|Sent from Mail for Windows|Get Outlook for\s)', re.IGNORECASE)
+_CHARSET = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+_BLANK_LINES = re.compile(r'\n{3,}')
+_SPACES = re.compile(r'[ \t\r\f\v\xa0]+')
+# How far below an Outlook "From:" line the "Sent:"/"Date:" line may be.
+OUTLOOK_HEADER_LINES = 4
+
+def decode_body(data: str, charset: str = 'utf-8') -> str:
+    """Decodes a Gmail base64url body, tolerating missing padding and unknown or wrong charsets."""
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        return ''
+    try:
+        return raw.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return raw.decode('utf-8', errors='replace')
+
+def _part_charset(part: dict) -> str:
+    for header in part.get('headers') or []:
+        if header.get('name', '').lower() == 'content-type':
+            match = _CHARSET.search(header.get('value', ''))
+            if match:
+                return match.group(1)
+    return 'utf-8'
+
+def find_body(payload: dict) -> tuple[str, str]:
+    """
+    Finds the body of a Gmail message payload, walking nested multipart trees without recursion.
+
+    The first text/plain part wins; the first text/html part is the fallback, so HTML-only mail is
+    not lost. A single-part payload is its own body. Attachments are skipped.
+
+    Returns:
+        tuple[str, str]: The decoded body and its MIME type ('text/plain' or 'text/html'),
+            or (None, None) if the message has no text body.
+    """
+    html_part = None
+    stack = [payload] if payload else []
+    while stack:
+        part = stack.pop()
+        if part.get('parts'):
+            # Reversed, so parts are visited in document order.
+            stack.extend(reversed(part['parts']))
+            continue
+        if part.get('filename') or not (part.get('body') or {}).get('data'):
+            continue
+        mime_type = part.get('mimeType', '')
+        if mime_type == 'text/plain':
+            return decode_body(part['body']['data'], _part_charset(part)), mime_type
+        if mime_type == 'text/html' and html_part is None:
+            html_part = part
+    if html_part is not None:
+        return decode_body(html_part['body']['data'], _part_charset(html_part)), 'text/html'
+    return None, None
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collects the visible text of an HTML email, leaving out quoted replies, scripts and styles."""
+    _BLOCK_TAGS = frozenset(('p', 'div', 'br', 'tr', 'li', 'ul', 'ol', 'table', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+                             'pre', 'hr', 'section', 'article', 'header', 'footer'))
+    _VOID_TAGS = frozenset(('br', 'img', 'hr', 'meta', 'link', 'input', 'wbr', 'col', 'area', 'base', 'source',
+                            'track', 'embed', 'param'))
+    _HIDDEN_TAGS = frozenset(('script', 'style', 'head', 'title', 'blockquote'))
+    # Containers Gmail, Outlook and Apple Mail wrap quoted replies and signatures in.
+    _HIDDEN_CLASSES = ('gmail_quote', 'gmail_signature', 'moz-cite-prefix', 'apple-mail-quote')
+    _HIDDEN_IDS = ('divRplyFwdMsg', 'appendonsend', 'Signature')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        # The tag of the hidden element being skipped, and how many elements with that tag are open
+        # inside it. Only that tag is counted, so unclosed <p> or <li> inside it cannot throw it off.
+        self._hidden_tag = None
+        self._hidden_depth = 0
+
+    def _is_hidden(self, tag, attrs) -> bool:
+        if tag in self._HIDDEN_TAGS:
+            return True
+        attributes = dict(attrs)
+        classes = attributes.get('class') or ''
+        return (any(name in classes for name in self._HIDDEN_CLASSES)
+                or (attributes.get('id') or '') in self._HIDDEN_IDS)
+
+    def handle_starttag(self, tag, attrs):
+        if self._hidden_tag:
+            if tag == self._hidden_tag:
+                self._hidden_depth += 1
+            return
+        if tag not in self._VOID_TAGS and self._is_hidden(tag, attrs):
+            self._hidden_tag, self._hidden_depth = tag, 1
+            return
+        if tag in self._BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        # A self-closing tag such as <br/> opens no element, so it never affects the hidden depth.
+        if not self._hidden_tag and tag in self._BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self._VOID_TAGS:
+            return
+        if self._hidden_tag:
+            if tag == self._hidden_tag:
+                self._hidden_depth -= 1
+                if not self._hidden_depth:
+                    self._hidden_tag = None
+        elif tag in self._BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_data(self, data):
+        if not self._hidden_tag:
+            self.chunks.append(_SPACES.sub(' ', data.replace('\n', ' ')))
+
+def html_to_text(html: str) -> str:
+    """Converts an HTML email body to plain text, one line per block element."""
+    parser = _HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = (line.strip() for line in ''.join(parser.chunks).split('\n'))
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines))
+
+def clean_email_text(text: str) -> str:
+    """
+    Keeps only the text the sender wrote: cuts at the first reply header (Gmail/Apple "On ... wrote:",
+    "-----Original Message-----", an Outlook From/Sent block) or signature ("-- ", "Sent from my ..."),
+    and drops ">"-quoted lines. The text is scanned once, line by line.
+    """
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    kept = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith('>'):
+            continue
+        if (_SIGNATURE_DELIMITER.match(line) or _MOBILE_SIGNATURE.match(stripped)
+                or _ORIGINAL_MESSAGE.match(stripped) or _REPLY_HEADER.match(stripped)):
+            break
+        # Long reply headers are wrapped by the sending client: "On ..., Alice <alice@" / "example.com> wrote:".
+        if stripped.startswith(('On ', 'Le ', 'Am ', 'El ')) and i + 1 < len(lines) \
+                and _REPLY_HEADER.match(f'{stripped} {lines[i + 1].strip()}'):
+            break
+        if _OUTLOOK_FROM.match(stripped) and any(
+                _OUTLOOK_SENT.match(following.strip()) for following in lines[i + 1:i + 1 + OUTLOOK_HEADER_LINES]):
+            if kept and _OUTLOOK_RULE.match(kept[-1].strip()):
+                kept.pop()
+            break
+        kept.append(line)
+    return _BLANK_LINES.sub('\n\n', '\n'.join(kept)).strip()
+
+def extract_clean_text(msg: dict) -> str:
+    """
+    Returns the cleaned body of a full-format Gmail message resource: the plain-text part, or the
+    HTML part converted to text when there is none, without quoted replies or signature.
+
+    Returns:
+        str: The cleaned text, or None if the message has no text body or nothing is left after cleaning.
+    """
+    body, mime_type = find_body((msg or {}).get('payload'))
+    if not body:
+        return None
+    if mime_type == 'text/html':
+        body = html_to_text(body)
+    return clean_email_text(body) or None
@@ -0,0 +1,142 @@
+# digital_twin_agent/core/embedding_cache.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+# The cache lives next to `chroma_db` and survives collection rebuilds.
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'embedding_cache.sqlite3')
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv('EMBEDDING_CACHE_MAX_MB', '512')) * 1024 * 1024
+# Recency is tracked to the hour: a hit on an entry used within the last hour records nothing.
+RECENCY_RESOLUTION_SECONDS = 3600
+
+_WHITESPACE = re.compile(r'\s+')
+
+class EmbeddingCache:
+    """
+    A disk-backed, content-addressed cache of embeddings stored as float32 blobs in SQLite.
+    Entries are keyed by a hash of the model name and the normalised text, so identical
+    text is only ever embedded once per model. The least recently used entries are evicted
+    once the stored vectors exceed `max_bytes`.
+
+    Lookups never write: hits only note their new recency in memory, and those notes are
+    written together with the next batch of new embeddings (i.e. by ingestion).
+    """
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        """
+        Args:
+            path (str): The SQLite database file.
+            max_bytes (int): The size budget for stored vectors.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # key -> time of a hit whose recency has not been written yet.
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._conn.commit()
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM embeddings').fetchone()[0]
+
+    @staticmethod
+    def make_key(model_key: str, text: str) -> str:
+        """Hashes the model identifier together with the normalised text."""
+        normalised = _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+        return hashlib.sha256(f'{model_key}\0{normalised}'.encode('utf-8')).hexdigest()
+
+    def get_many(self, model_key: str, texts: list[str]) -> list:
+        """
+        Looks up cached embeddings.
+
+        Returns:
+            list: One entry per text; the cached embedding as a list of floats, or None on a miss.
+        """
+        keys = [self.make_key(model_key, text) for text in texts]
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look keys up in chunks.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f'SELECT key, vector, last_used FROM embeddings WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                for key, vector, last_used in rows:
+                    found[key] = vector
+                    if last_used < now - RECENCY_RESOLUTION_SECONDS:
+                        self._touched[key] = now
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return [array('f', found[key]).tolist() if key in found else None for key in keys]
+
+    def put_many(self, model_key: str, texts: list[str], embeddings: list[list[float]]):
+        """Stores embeddings for the given texts, evicting old entries if the cache grows past its budget."""
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            blob = array('f', embedding).tobytes()
+            rows.append((self.make_key(model_key, text), blob, len(blob), now))
+        with self._lock:
+            existing = self._sizes_of([row[0] for row in rows])
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)', rows
+            )
+            self._total_bytes += sum(row[2] for row in rows) - sum(existing.values())
+            # Recent hits are written first, so eviction does not drop entries that are still in use.
+            if self._touched:
+                self._conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                       [(used, key) for key, used in self._touched.items()])
+                self._touched.clear()
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _sizes_of(self, keys: list[str]) -> dict:
+        sizes = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            sizes.update(self._conn.execute(
+                f'SELECT key, size FROM embeddings WHERE key IN ({",".join("?" * len(chunk))})', chunk
+            ).fetchall())
+        return sizes
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under 90% of its budget,
+        # so eviction does not run again on every write.
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute('SELECT key, size FROM embeddings ORDER BY last_used LIMIT 1000').fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                self._conn.execute('DELETE FROM embeddings WHERE key = ?', (key,))
+                self._total_bytes -= size
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters for this process and the cache's current size."""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': entries,
+                'bytes': self._total_bytes
+            }
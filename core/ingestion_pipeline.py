@@ -0,0 +1,196 @@
+# digital_twin_agent/core/ingestion_pipeline.py
+
+import queue
+import threading
+import time
+
+# Marks the end of a stage's input.
+_DONE = object()
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.first_started = None
+        self.last_finished = None
+        self._lock = threading.Lock()
+
+    def record(self, started: float, count: int = 1):
+        """Records `count` items whose processing began at `started` and ends now."""
+        finished = time.perf_counter()
+        with self._lock:
+            self.items += count
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            if self.last_finished is None or finished > self.last_finished:
+                self.last_finished = finished
+
+    @property
+    def elapsed(self) -> float:
+        if self.first_started is None:
+            return 0.0
+        return self.last_finished - self.first_started
+
+    @property
+    def rate(self) -> float:
+        """Items per second over the stage's active period."""
+        return self.items / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {'stage': self.name, 'items': self.items, 'seconds': round(self.elapsed, 3),
+                'items_per_second': round(self.rate, 1)}
+
+
+class IngestionPipeline:
+    """
+    A staged producer/consumer pipeline for email ingestion:
+
+        message IDs -> [fetch workers] -> raw queue -> [process workers] -> document queue -> sink
+
+    Fetching, MIME walking/cleaning and embedding overlap, and every queue between stages is
+    bounded, so memory use stays flat no matter how many messages flow through.
+    """
+    def __init__(self, fetch_fn, process_fn, sink_fn, fetch_workers: int = 4, process_workers: int = 4,
+                 fetch_chunk_size: int = 50, sink_batch_size: int = 64, queue_size: int = 256):
+        """
+        Args:
+            fetch_fn (callable): Takes a list of message IDs and returns a dict of message resources keyed by ID.
+                Called concurrently from several threads.
+            process_fn (callable): Takes (message_id, message) and returns the document to store, or None to skip it.
+            sink_fn (callable): Takes a list of (message_id, document, fetched) tuples and writes them.
+                Returning False or raising aborts the pipeline; that batch counts as not written.
+            fetch_workers (int): Number of concurrent fetcher threads.
+            process_workers (int): Number of threads extracting and cleaning message bodies.
+            fetch_chunk_size (int): Number of IDs handed to a single `fetch_fn` call.
+            sink_batch_size (int): Number of processed messages handed to a single `sink_fn` call.
+            queue_size (int): Capacity of each inter-stage queue.
+        """
+        self.fetch_fn = fetch_fn
+        self.process_fn = process_fn
+        self.sink_fn = sink_fn
+        self.fetch_workers = fetch_workers
+        self.process_workers = process_workers
+        self.fetch_chunk_size = fetch_chunk_size
+        self.sink_batch_size = sink_batch_size
+        self.queue_size = queue_size
+
+    def run(self, message_ids: list[str]) -> dict:
+        """
+        Streams the given messages through every stage.
+
+        Returns:
+            dict: 'completed' (False if the sink aborted or failed) and per-stage 'stats' from `StageStats.as_dict`.
+        """
+        stats = {name: StageStats(name) for name in ('fetch', 'process', 'sink')}
+        stop = threading.Event()
+        chunk_queue = queue.Queue()
+        raw_queue = queue.Queue(maxsize=self.queue_size)
+        doc_queue = queue.Queue(maxsize=self.queue_size)
+
+        for start in range(0, len(message_ids), self.fetch_chunk_size):
+            chunk_queue.put(message_ids[start:start + self.fetch_chunk_size])
+        for _ in range(self.fetch_workers):
+            chunk_queue.put(_DONE)
+
+        def _put(q, item):
+            # Blocks while the next stage is busy, but gives up once the pipeline is aborted.
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def _get(q):
+            # Like q.get(), but returns _DONE once the pipeline is aborted.
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def _fetcher():
+            while True:
+                chunk = _get(chunk_queue)
+                if chunk is _DONE:
+                    return
+                started = time.perf_counter()
+                try:
+                    fetched = self.fetch_fn(chunk)
+                except Exception as e:
+                    print(f"Error fetching {len(chunk)} messages: {e}")
+                    fetched = {}
+                stats['fetch'].record(started, len(chunk))
+                for message_id in chunk:
+                    _put(raw_queue, (message_id, fetched.get(message_id)))
+
+        def _processor():
+            while True:
+                item = _get(raw_queue)
+                if item is _DONE:
+                    return
+                message_id, message = item
+                started = time.perf_counter()
+                document = None
+                if message is not None:
+                    try:
+                        document = self.process_fn(message_id, message)
+                    except Exception as e:
+                        print(f"Error processing message {message_id}: {e}")
+                stats['process'].record(started)
+                _put(doc_queue, (message_id, document, message is not None))
+
+        def _close_stages(fetchers, processors):
+            for thread in fetchers:
+                thread.join()
+            for _ in processors:
+                _put(raw_queue, _DONE)
+            for thread in processors:
+                thread.join()
+            _put(doc_queue, _DONE)
+
+        fetchers = [threading.Thread(target=_fetcher, daemon=True) for _ in range(self.fetch_workers)]
+        processors = [threading.Thread(target=_processor, daemon=True) for _ in range(self.process_workers)]
+        for thread in fetchers + processors:
+            thread.start()
+        closer = threading.Thread(target=_close_stages, args=(fetchers, processors), daemon=True)
+        closer.start()
+
+        # The sink runs on the calling thread, so writes to the vector store stay serialized.
+        completed = True
+        batch = []
+        try:
+            while True:
+                item = doc_queue.get()
+                if item is not _DONE:
+                    batch.append(item)
+                if batch and (item is _DONE or len(batch) >= self.sink_batch_size):
+                    started = time.perf_counter()
+                    try:
+                        written = self.sink_fn(batch)
+                    except Exception as e:
+                        print(f"Error writing {len(batch)} messages: {e}")
+                        written = False
+                    if written is False:
+                        completed = False
+                        break
+                    stats['sink'].record(started, len(batch))
+                    batch = []
+                if item is _DONE:
+                    break
+        finally:
+            # However the sink loop ended, the other stages must not keep fetching into queues nobody drains.
+            stop.set()
+            closer.join()
+        return {'completed': completed, 'stats': [s.as_dict() for s in stats.values()]}
+
+
+def print_pipeline_stats(result: dict):
+    """Prints the per-stage throughput counters returned by `IngestionPipeline.run`."""
+    print("\n--- Ingestion Throughput ---")
+    for stage in result['stats']:
+        print(f"{stage['stage']:>8}: {stage['items']} messages in {stage['seconds']:.2f}s "
+              f"({stage['items_per_second']:.1f} messages/s)")
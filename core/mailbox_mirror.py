@@ -0,0 +1,158 @@
+# digital_twin_agent/core/mailbox_mirror.py
+
+import os
+import re
+import sqlite3
+import threading
+
+# The mirror lives next to the `chroma_db` directory.
+MAILBOX_MIRROR_PATH = os.getenv(
+    'MAILBOX_MIRROR_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mailbox.sqlite3')
+)
+# Words too common to help a keyword search; natural-language questions are full of them.
+_STOPWORDS = frozenset(
+    'a about after all also an and any are as at be been before but by can could did do does for from had has '
+    'have he her him his how i if in into is it its me my no not of on or our she so some than that the their '
+    'them then there these they this to up us was we were what when where which who why will with would you your '
+    'say said says tell told email emails mail message messages'.split()
+)
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT NOT NULL UNIQUE,
+    thread_id TEXT,
+    sender TEXT,
+    recipients TEXT,
+    subject TEXT,
+    date INTEGER,
+    label_ids TEXT,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_sender_date ON messages (sender, date);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, body, content='messages', content_rowid='rowid', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (new.rowid, new.subject, new.sender, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, body)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, body)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.body);
+    INSERT INTO messages_fts (rowid, subject, sender, body) VALUES (new.rowid, new.subject, new.sender, new.body);
+END;
+'''
+
+def keyword_query(text: str) -> str:
+    """
+    Turns a natural-language question into an FTS5 query: the meaningful words, each quoted so
+    punctuation and FTS operators in the question cannot break the syntax, joined with OR.
+    BM25 then ranks messages containing more of the (rarer) words first.
+    """
+    terms = dict.fromkeys(t.lower() for t in _TOKEN.findall(text) if t.lower() not in _STOPWORDS)
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+
+class MailboxMirror:
+    """
+    A local SQLite copy of ingested emails (headers and cleaned bodies) with an FTS5 full-text index,
+    so exact-term questions (names, invoice numbers, codes) are answered from disk with BM25 ranking.
+    """
+    def __init__(self, path: str = MAILBOX_MIRROR_PATH):
+        """
+        Args:
+            path (str): The SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def upsert_many(self, rows: list[dict]):
+        """
+        Stores or replaces messages. Each row holds the keys produced by `build_email_metadata`
+        ('message_id', 'thread_id', 'from', 'to_all', 'subject', 'date', 'label_ids') plus 'body'.
+        """
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                '''INSERT INTO messages (message_id, thread_id, sender, recipients, subject, date, label_ids, body)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (message_id) DO UPDATE SET
+                       thread_id = excluded.thread_id, sender = excluded.sender, recipients = excluded.recipients,
+                       subject = excluded.subject, date = excluded.date, label_ids = excluded.label_ids,
+                       body = excluded.body''',
+                [(row['message_id'], row.get('thread_id', ''), row.get('from', ''), row.get('to_all', ''),
+                  row.get('subject', ''), row.get('date', 0), row.get('label_ids', ''), row.get('body', ''))
+                 for row in rows]
+            )
+            self._conn.commit()
+
+    def search(self, query_text: str, limit: int = 10, sender: str = None, after: int = None,
+               before: int = None) -> list[dict]:
+        """
+        Full-text searches the mirror, best BM25 match first.
+
+        Args:
+            query_text (str): A question or keywords; see `keyword_query`.
+            limit (int): The maximum number of messages to return.
+            sender (str): Only match messages from this (lowercased) address.
+            after (int): Only match messages received at or after this epoch second.
+            before (int): Only match messages received at or before this epoch second.
+
+        Returns:
+            list[dict]: Matches with 'message_id', 'thread_id', 'from', 'subject', 'date', 'snippet'
+                (the best-matching passage of the body) and 'score' (BM25; lower is better).
+        """
+        match = keyword_query(query_text)
+        if not match:
+            return []
+        conditions, params = ['messages_fts MATCH ?'], [match]
+        if sender:
+            conditions.append('m.sender = ?')
+            params.append(sender)
+        if after is not None:
+            conditions.append('m.date >= ?')
+            params.append(after)
+        if before is not None:
+            conditions.append('m.date <= ?')
+            params.append(before)
+        # Subject hits weigh more than body hits.
+        sql = f'''
+            SELECT m.message_id, m.thread_id, m.sender, m.subject, m.date,
+                   snippet(messages_fts, 2, '', '', ' ... ', 64), bm25(messages_fts, 3.0, 1.0, 1.0) AS score
+            FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score LIMIT ?'''
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit]).fetchall()
+        return [{
+            'message_id': message_id, 'thread_id': thread_id, 'from': sender_address, 'subject': subject,
+            'date': date, 'snippet': snippet, 'score': score
+        } for message_id, thread_id, sender_address, subject, date, snippet, score in rows]
+
+    def count(self) -> int:
+        """Returns the number of mirrored messages."""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+
+# --- Process-wide Registry ---
+_registry_lock = threading.Lock()
+_mirrors = {}
+
+def get_mailbox_mirror(path: str = MAILBOX_MIRROR_PATH) -> MailboxMirror:
+    """Returns the shared mailbox mirror for a database file."""
+    with _registry_lock:
+        if path not in _mirrors:
+            _mirrors[path] = MailboxMirror(path)
+        return _mirrors[path]
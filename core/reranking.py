@@ -0,0 +1,76 @@
+# digital_twin_agent/core/reranking.py
+
+import os
+
+# --- Diversity Reranking Settings ---
+# Trade-off between relevance to the query (1.0) and novelty with respect to already chosen results (0.0).
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.7'))
+# Candidates at least this cosine-similar to an already chosen one are near-duplicates and never chosen.
+MMR_DUPLICATE_SIMILARITY = float(os.getenv('MMR_DUPLICATE_SIMILARITY', '0.95'))
+
+def count_tokens(text: str) -> int:
+    # The Qwen tokenizer loads its vocabulary when imported, so it is imported on first use.
+    from qwen_agent.utils.tokenization_qwen import count_tokens as qwen_count_tokens
+    return qwen_count_tokens(text)
+
+def mmr_select(query_embedding, candidate_embeddings, k: int = None, lambda_mult: float = MMR_LAMBDA,
+               costs: list[int] = None, budget: int = None, relevance: list[float] = None,
+               duplicate_similarity: float = MMR_DUPLICATE_SIMILARITY) -> list[int]:
+    """
+    Picks a relevant but non-redundant subset of candidates with maximal marginal relevance.
+
+    Each step picks the candidate maximising
+    `lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, chosen))`. All similarities are
+    computed up front as two matrix products, and each step only updates a running maximum.
+
+    Args:
+        query_embedding (array-like): The query vector. Unused when `relevance` is given.
+        candidate_embeddings (array-like): One vector per candidate, typically ordered by relevance.
+        k (int): The maximum number of candidates to pick. Defaults to no limit.
+        lambda_mult (float): The relevance/diversity trade-off in [0, 1].
+        costs (list[int]): Optional cost of each candidate, e.g. its token count.
+        budget (int): Optional cap on the summed cost of the picks. Candidates that no longer fit are
+            skipped, but the most relevant candidate is always picked so the result is never empty.
+        relevance (list[float]): Optional relevance of each candidate in [0, 1], replacing its
+            similarity to the query, e.g. for candidates ranked by something other than embeddings.
+        duplicate_similarity (float): Cosine similarity above which a candidate is dropped as a
+            near-duplicate of a pick. None disables the check.
+
+    Returns:
+        list[int]: Indices into `candidate_embeddings`, in pick order.
+    """
+    # Imported here: numpy comes with the vector store's dependencies and is only needed at query time.
+    import numpy as np
+
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.ndim != 2 or not len(candidates):
+        return []
+    # Cosine similarity, whether or not the embeddings were stored normalised.
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        relevance = candidates @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    k = len(candidates) if k is None else min(k, len(candidates))
+    costs = np.asarray(costs if costs is not None else np.zeros(len(candidates)), dtype=np.float64)
+    remaining = float('inf') if budget is None else float(budget)
+    available = np.ones(len(candidates), dtype=bool)
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+    picked = []
+    while len(picked) < k:
+        eligible = available if not picked else available & (costs <= remaining)
+        if not eligible.any():
+            break
+        redundancy = np.where(np.isinf(max_similarity), 0.0, max_similarity)
+        scores = np.where(eligible, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        choice = int(np.argmax(scores))
+        picked.append(choice)
+        available[choice] = False
+        remaining -= costs[choice]
+        max_similarity = np.maximum(max_similarity, similarity[choice])
+        if duplicate_similarity is not None:
+            available &= similarity[choice] < duplicate_similarity
+    return picked
@@ -0,0 +1,102 @@
+# digital_twin_agent/core/session_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from core.ttl_cache import TTLCache
+
+# --- Session Settings ---
+# Sessions kept in memory; the least recently used are dropped first (and reloaded from SQLite if enabled).
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1000'))
+# Sessions idle for longer than this are forgotten.
+SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', str(24 * 3600)))
+# Retention policy: only the most recent messages of a conversation are kept.
+SESSION_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', '200'))
+# Optional SQLite file that keeps sessions across restarts and LRU evictions.
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH')
+
+class SessionStore:
+    """
+    Keeps each conversation's history on the server, keyed by a session ID, so clients only
+    send new messages. Sessions live in an in-process LRU cache, optionally backed by SQLite.
+    """
+    def __init__(self, max_sessions: int = SESSION_CACHE_SIZE, ttl: float = SESSION_TTL_SECONDS,
+                 max_messages: int = SESSION_MAX_MESSAGES, db_path: str = SESSION_DB_PATH):
+        """
+        Args:
+            max_sessions (int): The number of sessions cached in memory.
+            ttl (float): Seconds of inactivity after which a session expires.
+            max_messages (int): The maximum number of messages retained per session.
+            db_path (str): Optional SQLite file to persist sessions to.
+        """
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._cache = TTLCache(maxsize=max_sessions, ttl=ttl)
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated REAL NOT NULL)'
+            )
+            self._conn.commit()
+
+    def create(self) -> str:
+        """Starts an empty session and returns its ID."""
+        session_id = uuid.uuid4().hex
+        self._save(session_id, [])
+        return session_id
+
+    def get(self, session_id: str):
+        """
+        Returns a copy of the session's messages, or None if the session is unknown or has expired.
+        """
+        messages = self._cache.get(session_id)
+        if messages is None and self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    'SELECT messages FROM sessions WHERE id = ? AND updated >= ?', (session_id, time.time() - self.ttl)
+                ).fetchone()
+            if row is not None:
+                messages = json.loads(row[0])
+                self._cache.set(session_id, messages)
+        return list(messages) if messages is not None else None
+
+    def append(self, session_id: str, new_messages: list):
+        """Adds messages to a session and applies the retention policy."""
+        messages = (self.get(session_id) or []) + list(new_messages)
+        self._save(session_id, self._apply_retention(messages))
+
+    def delete(self, session_id: str):
+        """Forgets a session."""
+        self._cache.pop(session_id)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+                self._conn.commit()
+
+    def _apply_retention(self, messages: list) -> list:
+        if len(messages) <= self.max_messages:
+            return messages
+        messages = messages[-self.max_messages:]
+        # A conversation must start with a user turn, so drop any partial turn left at the front.
+        for i, message in enumerate(messages):
+            if message.get('role') == 'user':
+                return messages[i:]
+        return []
+
+    def _save(self, session_id: str, messages: list):
+        self._cache.set(session_id, messages)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO sessions (id, messages, updated) VALUES (?, ?, ?)',
+                    (session_id, json.dumps(messages), time.time())
+                )
+                # Expired sessions are removed opportunistically on write.
+                self._conn.execute('DELETE FROM sessions WHERE updated < ?', (time.time() - self.ttl,))
+                self._conn.commit()
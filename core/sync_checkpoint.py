@@ -0,0 +1,57 @@
+# digital_twin_agent/core/sync_checkpoint.py
+
+import json
+import os
+
+# Checkpoints live next to the `chroma_db` directory they describe.
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sync_state')
+
+class SyncCheckpoint:
+    """
+    Persists the progress of a Gmail ingestion run so it can be resumed after a crash
+    and continued incrementally through the Gmail history API on the next run.
+    """
+    def __init__(self, name: str):
+        """
+        Loads the checkpoint with the given name, or starts an empty one.
+
+        Args:
+            name (str): The checkpoint name, e.g. 'sent_mail'. One file is kept per name.
+        """
+        self.path = os.path.join(CHECKPOINT_DIR, f'{name}.json')
+        # The mailbox historyId up to which every message has been ingested.
+        self.history_id = None
+        # False until one pass over the whole folder has finished; an interrupted pass is resumed.
+        self.full_sync_complete = False
+        self.processed_ids = set()
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.history_id = state.get('history_id')
+            self.full_sync_complete = state.get('full_sync_complete', False)
+            self.processed_ids = set(state.get('processed_ids', []))
+
+    def mark_processed(self, message_ids):
+        """Records message IDs whose documents have been written to the vector store."""
+        self.processed_ids.update(message_ids)
+
+    def save(self):
+        """Writes the checkpoint atomically, so a crash mid-write never leaves a corrupt file behind."""
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        state = {
+            'history_id': self.history_id,
+            'full_sync_complete': self.full_sync_complete,
+            'processed_ids': sorted(self.processed_ids)
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """Forgets the history position so the next run performs a full sync, keeping processed IDs."""
+        self.history_id = None
+        self.full_sync_complete = False
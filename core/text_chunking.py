@@ -0,0 +1,49 @@
+# digital_twin_agent/core/text_chunking.py
+
+import hashlib
+import re
+
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces. English averages roughly 1.3 word
+# pieces per word, so 180-word chunks stay under the limit with room to spare.
+CHUNK_WORDS = 180
+# Words repeated at the start of the next chunk, so a sentence cut at a boundary is still
+# embedded whole in one of the two chunks.
+CHUNK_OVERLAP_WORDS = 40
+
+_WORD = re.compile(r'\S+')
+_WHITESPACE = re.compile(r'\s+')
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS) -> list[str]:
+    """
+    Splits text into overlapping windows of at most `chunk_words` words.
+    Chunks are sliced from the original text, so line breaks and spacing inside a chunk are preserved.
+
+    Args:
+        text (str): The text to split.
+        chunk_words (int): The maximum number of words per chunk.
+        overlap_words (int): The number of words shared by consecutive chunks.
+
+    Returns:
+        list[str]: The chunks in order. Text of `chunk_words` words or fewer comes back as a single chunk.
+    """
+    words = [match.span() for match in _WORD.finditer(text)]
+    if not words:
+        return []
+    if len(words) <= chunk_words:
+        return [text[words[0][0]:words[-1][1]]]
+
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+    for start in range(0, len(words), step):
+        window = words[start:start + chunk_words]
+        chunks.append(text[window[0][0]:window[-1][1]])
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+def content_hash(text: str) -> str:
+    """
+    Returns a stable ID for a piece of text, ignoring case and whitespace differences.
+    Identical passages (e.g. the same paragraph quoted across a thread) map to the same ID.
+    """
+    return hashlib.sha1(_WHITESPACE.sub(' ', text).strip().lower().encode('utf-8')).hexdigest()
@@ -0,0 +1,83 @@
+# digital_twin_agent/core/tool_scheduler.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+class ToolCallScheduler:
+    """
+    Runs the independent read-only tool calls an LLM emits in one step concurrently.
+
+    The agent still consumes results one call at a time, in order. When the first call of a step is
+    reached, every read-only call up to the first write call is started on a bounded thread pool, and
+    each later call just collects its result. Write calls, and anything the model asked for after
+    one, run in order on the agent's own thread, so a write never races a read or another write, and
+    the confirmation protocol is unaffected.
+    """
+    def __init__(self, read_only_tools, executor: ThreadPoolExecutor):
+        """
+        Args:
+            read_only_tools (iterable[str]): Names of tools without side effects that are safe to run concurrently.
+            executor (ThreadPoolExecutor): The bounded pool prefetched calls run on. It may be shared by several schedulers.
+        """
+        self.read_only_tools = frozenset(read_only_tools)
+        self._executor = executor
+        self._futures = {}
+
+    def parallel_prefix(self, calls: list) -> list[int]:
+        """Returns the indices of the read-only calls that come before the first write call."""
+        indices = []
+        for i, (tool_name, _) in enumerate(calls):
+            if tool_name not in self.read_only_tools:
+                break
+            indices.append(i)
+        return indices
+
+    def begin_step(self, calls: list, run_tool):
+        """
+        Starts the concurrent part of a step.
+
+        Args:
+            calls (list[tuple[str, str]]): The step's (tool_name, tool_args) calls, in the order the model emitted them.
+            run_tool (callable): Takes (tool_name, tool_args) and returns the tool's result.
+        """
+        self._futures = {}
+        indices = self.parallel_prefix(calls)
+        # A single call gains nothing from a thread hop.
+        if len(indices) > 1:
+            for i in indices:
+                self._futures[i] = (calls[i], self._executor.submit(run_tool, *calls[i]))
+
+    def result(self, index: int, tool_name: str, tool_args: str, run_tool):
+        """
+        Returns the result of the step's `index`-th call, from its prefetched future if it has one,
+        otherwise by running it now with `run_tool(tool_name, tool_args)`.
+        """
+        prefetched = self._futures.pop(index, None)
+        if prefetched is not None and prefetched[0] == (tool_name, tool_args):
+            return prefetched[1].result()
+        return run_tool(tool_name, tool_args)
+
+
+def current_step_calls(messages: list) -> tuple[list, int]:
+    """
+    Finds the tool calls of the step an agent is executing, from its working message list.
+
+    The agent appends the LLM's output (one assistant message per function call) and then the result of
+    each call as it completes, so the step's calls are the assistant messages right before the trailing
+    function results, and the number of those results is the index of the call being made.
+
+    Returns:
+        tuple[list[tuple[str, str]], int]: The step's (tool_name, tool_args) calls and the current call's index.
+    """
+    i = len(messages)
+    completed = 0
+    while i > 0 and messages[i - 1].get('role') == 'function':
+        completed += 1
+        i -= 1
+    calls = []
+    while i > 0 and messages[i - 1].get('role') == 'assistant':
+        function_call = messages[i - 1].get('function_call')
+        if function_call:
+            calls.append((function_call.get('name'), function_call.get('arguments')))
+        i -= 1
+    calls.reverse()
+    return calls, completed
@@ -1,7 +1,192 @@
 # digital_twin_agent/core/vector_store_manager.py
 
-import chromadb
+import json
 import os
+import re
+import threading
+
+from core.embedding_cache import EmbeddingCache
+from core.reranking import count_tokens, mmr_select
+from core.ttl_cache import TTLCache
+
+# Define the path for the persistent ChromaDB storage
+CHROMA_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'chroma_db')
+
+# --- Embedding Settings ---
+# The default model matches the one ChromaDB used implicitly before, so existing collections stay compatible.
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+# Number of CPU threads used for inference. 0 leaves the library default in place.
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))
+# 'torch' or 'onnx'. The ONNX runtime is usually faster for small models on CPU-only hosts.
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_NORMALIZE = os.getenv('EMBEDDING_NORMALIZE', 'true').lower() == 'true'
+# Set to 'false' to always run the model instead of consulting the on-disk embedding cache.
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE', 'true').lower() == 'true'
+
+class EmbeddingBackend:
+    """
+    Turns text into vectors with a sentence-transformers model. The model is loaded on first use,
+    and texts are encoded in batches so ingestion and multi-query retrieval vectorise in one pass.
+    When a cache is attached, only texts it has not seen before reach the model.
+    """
+    def __init__(self, model_name: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 num_threads: int = EMBEDDING_THREADS, backend: str = EMBEDDING_BACKEND,
+                 normalize: bool = EMBEDDING_NORMALIZE, cache: EmbeddingCache = None):
+        """
+        Args:
+            model_name (str): The sentence-transformers model to load.
+            batch_size (int): How many texts are encoded per forward pass.
+            num_threads (int): CPU threads for inference; 0 keeps the library default.
+            backend (str): 'torch' or 'onnx'.
+            normalize (bool): Whether to L2-normalise embeddings, which makes L2 ranking match cosine ranking.
+            cache (EmbeddingCache): Optional persistent cache consulted before running the model.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.backend = backend
+        self.normalize = normalize
+        self.cache = cache
+        # Identifies the vectors this configuration produces; part of every cache key.
+        self.cache_key = f'{model_name}|normalize={normalize}'
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._load_lock:
+            if self._model is None:
+                self._model = self._load_model()
+            return self._model
+
+    def _load_model(self):
+        # Thread settings must be in place before the runtime spins up its pools.
+        if self.num_threads:
+            os.environ['OMP_NUM_THREADS'] = str(self.num_threads)
+            import torch
+            torch.set_num_threads(self.num_threads)
+        from sentence_transformers import SentenceTransformer
+        print(f"Loading embedding model '{self.model_name}' ({self.backend} backend)...")
+        if self.backend == 'onnx':
+            model_kwargs = {'provider': 'CPUExecutionProvider'}
+            if self.num_threads:
+                # onnxruntime ignores the torch/OpenMP settings above and sizes its pools per session.
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = self.num_threads
+                session_options.inter_op_num_threads = 1
+                model_kwargs['session_options'] = session_options
+            return SentenceTransformer(self.model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+        return SentenceTransformer(self.model_name, device='cpu')
+
+    def embed_many(self, texts: list[str], store: bool = True) -> list[list[float]]:
+        """
+        Embeds many texts in batched forward passes.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            store (bool): Whether to add newly computed embeddings to the cache. Query-time callers
+                pass False, so a search only ever reads the cache.
+
+        Returns:
+            list[list[float]]: One embedding per text, in order.
+        """
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._encode(texts)
+
+        embeddings = self.cache.get_many(self.cache_key, texts)
+        # Each distinct uncached text is encoded once, however often it repeats in the batch.
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            computed = dict(zip(missing, self._encode(missing)))
+            if store:
+                self.cache.put_many(self.cache_key, missing, [computed[text] for text in missing])
+            embeddings = [embedding if embedding is not None else computed[text]
+                          for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        embeddings = self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=self.normalize,
+            convert_to_numpy=True, show_progress_bar=False
+        )
+        return embeddings.tolist()
+
+    def embed(self, text: str, store: bool = True) -> list[float]:
+        """Embeds a single text."""
+        return self.embed_many([text], store)[0]
+
+# --- Query Result Cache ---
+# Repeated retrievals (the same style topic or question asked several times in a conversation)
+# are answered from memory. A collection's cache is cleared whenever documents are written to it.
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '256'))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('QUERY_CACHE_TTL_SECONDS', '300'))
+
+_WHITESPACE = re.compile(r'\s+')
+
+def _normalise_query(query_text: str) -> str:
+    return _WHITESPACE.sub(' ', query_text).strip().lower()
+
+# --- Hybrid Retrieval ---
+# The RRF constant from Cormack et al.; it damps the influence of the very top ranks of any one list.
+RRF_K = 60
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[tuple[str, float]]:
+    """
+    Fuses several rankings of the same items by summing 1 / (k + rank) across the lists an item appears in.
+    Only ranks are used, so lists scored on incomparable scales (BM25, vector distances) fuse directly.
+
+    Args:
+        rankings (list[list[str]]): Item keys, each list ordered from best to worst.
+        k (int): The smoothing constant.
+
+    Returns:
+        list[tuple[str, float]]: (key, fused score) pairs, best first. Ties keep first-seen order.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+# --- Process-wide Registry ---
+# Every tool shares one ChromaDB client per database path, one embedding backend,
+# and one VectorStoreManager per collection.
+_registry_lock = threading.RLock()
+_clients = {}
+_embedding_backend = None
+_managers = {}
+
+def get_chroma_client(db_path: str = CHROMA_DB_PATH):
+    """Returns the process-wide persistent ChromaDB client for `db_path`, creating it on first use."""
+    with _registry_lock:
+        if db_path not in _clients:
+            # Imported here: chromadb is slow to import and only needed once a tool touches a collection.
+            import chromadb
+            _clients[db_path] = chromadb.PersistentClient(path=db_path)
+            print(f"Database is persistently stored at: {db_path}")
+        return _clients[db_path]
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Returns the process-wide embedding backend, so the embedding model is loaded only once."""
+    global _embedding_backend
+    with _registry_lock:
+        if _embedding_backend is None:
+            _embedding_backend = EmbeddingBackend(cache=EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None)
+        return _embedding_backend
+
+def get_vector_store(collection_name: str = "writing_style_collection") -> "VectorStoreManager":
+    """
+    Returns the shared VectorStoreManager for a collection.
+    Tools should use this instead of constructing VectorStoreManager directly.
+    """
+    with _registry_lock:
+        if collection_name not in _managers:
+            _managers[collection_name] = VectorStoreManager(collection_name=collection_name)
+        return _managers[collection_name]
 
 class VectorStoreManager:
     """
@@ -9,76 +194,252 @@ class VectorStoreManager:
     """
     def __init__(self, collection_name="writing_style_collection"):
         """
-        Initializes the ChromaDB client and gets or creates a collection.
+        Gets or creates a collection on the shared ChromaDB client.
         
         Args:
             collection_name (str): The name of the collection to store the writing style vectors.
         """
-        # Define the path for the persistent ChromaDB storage
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'chroma_db')
-        
-        # Initialize the persistent client
-        self.client = chromadb.PersistentClient(path=db_path)
+        # Reuse the process-wide client and embedding model rather than loading new ones.
+        self.client = get_chroma_client()
+        self.embedder = get_embedding_backend()
         
         # Get or create the collection. A collection is like a table in a traditional database.
-        self.collection = self.client.get_or_create_collection(name=collection_name)
+        # Embeddings are always computed by `self.embedder` and passed in, so no Chroma-side function is attached.
+        self.collection = self.client.get_or_create_collection(name=collection_name, embedding_function=None)
+        self.collection_name = collection_name
+        self.query_cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL_SECONDS)
         
         print(f"Vector store manager initialized. Using collection: '{collection_name}'")
-        print(f"Database is persistently stored at: {db_path}")
 
-    def add_documents(self, documents: list[str], ids: list[str]):
+    def add_documents(self, documents: list[str], ids: list[str], metadatas: list[dict] = None) -> bool:
         """
         Adds documents to the vector store collection.
-        ChromaDB will automatically handle tokenization and embedding.
+        The documents are embedded in batches by the shared embedding backend.
+        Documents are upserted, so re-adding an existing ID (e.g. when an interrupted
+        ingestion run is resumed) replaces it instead of failing.
 
         Args:
             documents (list[str]): A list of text chunks to add (e.g., email bodies).
             ids (list[str]): A list of unique identifiers for each document.
+            metadatas (list[dict]): Optional structured metadata for each document, usable in `where` filters.
+
+        Returns:
+            bool: True if the documents were written (or there was nothing to write), False on error.
         """
         if not documents:
             print("No documents to add.")
-            return
+            return True
 
         print(f"Adding {len(documents)} documents to the vector store...")
         try:
-            self.collection.add(
+            self.collection.upsert(
                 documents=documents,
+                embeddings=self.embedder.embed_many(documents),
+                metadatas=metadatas,
                 ids=ids
             )
+            # Cached results may no longer be the nearest neighbours.
+            self.query_cache.clear()
             print("Successfully added documents to the collection.")
+            return True
         except Exception as e:
             print(f"Error adding documents to vector store: {e}")
+            return False
 
-    def search(self, query_text: str, n_results: int = 5) -> list:
+    def existing_ids(self, ids: list[str]) -> list[str]:
+        """Returns the subset of `ids` already stored in the collection."""
+        if not ids:
+            return []
+        return self.collection.get(ids=ids, include=[])['ids']
+
+    def count(self) -> int:
+        """Returns the number of documents in the collection."""
+        return self.collection.count()
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Embeds many texts in one batched pass with the shared embedding backend."""
+        return self.embedder.embed_many(texts)
+
+    def search(self, query_text: str, n_results: int = 5, where: dict = None) -> list:
         """
         Searches the collection for documents similar to the query text.
 
         Args:
             query_text (str): The text to search for.
             n_results (int): The number of similar documents to return.
+            where (dict): Optional Chroma metadata filter, e.g. {'to:alice@example.com': True} or
+                {'date': {'$gte': 1717200000}}. Candidates are pruned inside the index.
 
         Returns:
             list: A list of the most similar documents found.
         """
-        print(f"Searching for text similar to: '{query_text[:50]}...'")
+        return self.search_many([query_text], n_results=n_results, where=where)[0]['documents']
+
+    def search_many(self, queries: list[str], n_results: int = 5, where: dict = None,
+                    include_embeddings: bool = False) -> list[dict]:
+        """
+        Searches the collection for several queries at once. Uncached queries are embedded
+        in one batched pass and sent to Chroma in a single query call.
+
+        Args:
+            queries (list[str]): The texts to search for.
+            n_results (int): The number of similar documents to return per query.
+            where (dict): Optional Chroma metadata filter applied to every query.
+            include_embeddings (bool): Whether to also return the stored embedding of each document.
+
+        Returns:
+            list[dict]: One result per query, in order, each with 'ids', 'documents', 'distances'
+                and 'metadatas' lists (plus 'embeddings' if requested) ordered from most to least similar.
+        """
+        fields = ('ids', 'documents', 'distances', 'metadatas') + (('embeddings',) if include_embeddings else ())
+        filter_key = json.dumps(where, sort_keys=True) if where else None
+        cache_keys = [(self.collection_name, _normalise_query(q), n_results, filter_key, include_embeddings)
+                      for q in queries]
+        results = [self.query_cache.get(key) for key in cache_keys]
+        if any(result is not None for result in results):
+            print(f"Serving {sum(r is not None for r in results)}/{len(queries)} queries from cache "
+                  f"(hit rate {self.query_cache.stats()['hit_rate']:.0%})")
+
+        # Queries that normalise to the same text are only searched once.
+        missing = {}
+        for query_text, key, result in zip(queries, cache_keys, results):
+            if result is None:
+                missing.setdefault(key, query_text)
+        if missing:
+            print(f"Searching for text similar to: {', '.join(repr(q[:50]) for q in missing.values())}")
+            fresh = {}
+            try:
+                response = self.collection.query(
+                    query_embeddings=self.embedder.embed_many(list(missing.values()), store=False),
+                    n_results=n_results,
+                    where=where,
+                    include=[field for field in fields if field != 'ids']
+                )
+                for i, key in enumerate(missing):
+                    # Embeddings come back as arrays, whose truth value is ambiguous, hence the `is not None`.
+                    fresh[key] = {
+                        field: response[field][i] if response.get(field) is not None else []
+                        for field in fields
+                    }
+                    self.query_cache.set(key, fresh[key])
+            except Exception as e:
+                print(f"Error searching vector store: {e}")
+            empty = {field: [] for field in fields}
+            results = [result if result is not None else fresh.get(key, empty)
+                       for key, result in zip(cache_keys, results)]
+
+        # Hand out copies so callers cannot mutate cached entries.
+        return [{field: list(values) for field, values in result.items()} for result in results]
+
+    def rerank(self, query_text: str, documents: list[str], k: int, token_budget: int = None,
+               embeddings: list = None, relevance: list[float] = None) -> list[int]:
+        """
+        Chooses up to `k` of `documents` that are relevant but not redundant with each other,
+        with maximal marginal relevance, keeping their combined size within `token_budget`.
+
+        Args:
+            query_text (str): The query the documents were retrieved for.
+            documents (list[str]): The candidates, best first.
+            k (int): The maximum number of documents to keep.
+            token_budget (int): Optional cap on the summed token count of the kept documents.
+            embeddings (list): The candidates' embeddings, if already known; otherwise they are computed
+                (mostly from the embedding cache, for stored documents).
+            relevance (list[float]): Optional relevance scores to use instead of similarity to the query,
+                e.g. fused hybrid search scores. They are scaled so the best candidate scores 1.
+
+        Returns:
+            list[int]: Indices into `documents`, in pick order.
+        """
+        if not documents:
+            return []
+        if embeddings is None or not len(embeddings):
+            embeddings = self.embedder.embed_many(documents, store=False)
+        query_embedding = None
+        if relevance is not None:
+            top = max(relevance) or 1.0
+            relevance = [score / top for score in relevance]
+        else:
+            query_embedding = self.embedder.embed(query_text, store=False)
+        costs = [count_tokens(document) for document in documents] if token_budget else None
+        return mmr_select(query_embedding, embeddings, k=k, costs=costs, budget=token_budget, relevance=relevance)
+
+    def search_diverse(self, query_text: str, n_results: int = 3, candidates: int = 12, where: dict = None,
+                       token_budget: int = None) -> list[str]:
+        """
+        Over-fetches `candidates` nearest documents and keeps up to `n_results` diverse ones with `rerank`,
+        so near-duplicate results do not take up prompt space.
+
+        Returns:
+            list[str]: The kept documents, in pick order (the first is the most relevant).
+        """
+        result = self.search_many([query_text], n_results=max(candidates, n_results), where=where,
+                                  include_embeddings=True)[0]
+        picks = self.rerank(query_text, result['documents'], k=n_results, token_budget=token_budget,
+                            embeddings=result['embeddings'])
+        return [result['documents'][i] for i in picks]
+
+    def hybrid_search(self, query_text: str, keyword_index, n_results: int = 5, where: dict = None,
+                      keyword_filters: dict = None, candidates: int = 20) -> list[dict]:
+        """
+        Combines semantic search over this collection with a keyword (BM25) search, fusing the two
+        rankings per email with reciprocal rank fusion. Exact terms such as names or invoice numbers
+        that embeddings blur are still found, and emails matching both ways rank first.
+
+        Args:
+            query_text (str): The text to search for.
+            keyword_index: A full-text index with a `search(query_text, limit, **filters)` method returning
+                dicts with 'message_id' and 'snippet', best first, e.g. a `MailboxMirror`.
+            n_results (int): The number of emails to return.
+            where (dict): Optional Chroma metadata filter for the vector side.
+            keyword_filters (dict): The same restriction expressed as keyword index filters,
+                e.g. {'sender': ..., 'after': ..., 'before': ...}.
+            candidates (int): How many results each side contributes to the fusion.
+
+        Returns:
+            list[dict]: Up to `n_results` emails, best first, each with 'message_id', 'document' (the
+                best-matching chunk, or the keyword snippet for emails only the keyword side found),
+                'metadata', 'score' (the fused score) and 'sources' (which sides found it).
+        """
+        vector_hits = {}
+        vector_result = self.search_many([query_text], n_results=candidates, where=where)[0]
+        for document, metadata in zip(vector_result['documents'], vector_result['metadatas']):
+            # Several chunks of one email may match; the email ranks by its best chunk.
+            message_id = (metadata or {}).get('message_id')
+            if message_id and message_id not in vector_hits:
+                vector_hits[message_id] = (document, metadata)
+
         try:
-            results = self.collection.query(
-                query_texts=[query_text],
-                n_results=n_results
-            )
-            # The actual documents are in a nested list
-            return results['documents'][0] if results and results['documents'] else []
+            keyword_hits = {hit['message_id']: hit
+                            for hit in keyword_index.search(query_text, limit=candidates, **(keyword_filters or {}))}
         except Exception as e:
-            print(f"Error searching vector store: {e}")
-            return []
+            print(f"Keyword search failed, using vector results only: {e}")
+            keyword_hits = {}
+
+        fused = reciprocal_rank_fusion([list(vector_hits), list(keyword_hits)])
+        results = []
+        for message_id, score in fused[:n_results]:
+            sources = [name for name, hits in (('vector', vector_hits), ('keyword', keyword_hits)) if message_id in hits]
+            if message_id in vector_hits:
+                document, metadata = vector_hits[message_id]
+            else:
+                hit = keyword_hits[message_id]
+                document = hit['snippet']
+                metadata = {key: value for key, value in hit.items() if key not in ('snippet', 'score')}
+            results.append({'message_id': message_id, 'document': document, 'metadata': metadata,
+                            'score': score, 'sources': sources})
+        return results
+
+    def cache_stats(self) -> dict:
+        """Returns the query cache's hit/miss counters for this collection."""
+        return {'collection': self.collection_name, **self.query_cache.stats()}
 
 # --- Self-testing block ---
 if __name__ == '__main__':
     # This test demonstrates how to use the manager.
     print("Running VectorStoreManager self-test...")
     
-    # 1. Initialize the manager
-    vector_store = VectorStoreManager()
+    # 1. Get the shared manager for the default collection
+    vector_store = get_vector_store()
     
     # 2. Add some sample documents
     sample_docs = [
@@ -104,3 +465,9 @@ if __name__ == '__main__':
             print(f"{i+1}. {doc}")
     else:
         print("No results found.")
+
+    # 5. Search several probes in one round trip; the repeated query is served from the cache
+    probes = [search_query, "casual messages to friends", "technical discussions"]
+    for probe, result in zip(probes, vector_store.search_many(probes, n_results=1)):
+        print(f"{probe!r} -> {result['documents']} (distances: {result['distances']})")
+    print(f"\nQuery cache: {vector_store.cache_stats()}")
@@ -1,22 +1,46 @@
 # digital_twin_agent/run_ingestion.py
 
+import argparse
 from tools.email_tools import GmailTool
+from core.vector_store_manager import get_embedding_backend
 
 def main():
     """
-    Main function to run the one-time email ingestion process.
+    Main function to run the email ingestion process.
     """
+    parser = argparse.ArgumentParser(description="Ingest your emails into the Digital Twin's knowledge base.")
+    parser.add_argument(
+        '--mode', choices=['style', 'content', 'all'], default='all',
+        help="'style' learns your writing style from sent emails, 'content' indexes received and sent "
+             "emails for questions about what was said, 'all' does both (default)."
+    )
+    parser.add_argument(
+        '--max-emails', type=int, default=None,
+        help="Ingest at most this many new emails in this run (default: no limit). "
+             "A capped run is continued the next time the script runs."
+    )
+    args = parser.parse_args()
+
     print("--- Starting Email Ingestion for Digital Twin Persona ---")
-    print("This script will read your sent emails and store them in a local vector database to learn your writing style.")
-    print("This is a one-time setup process.")
+    print("This script reads your emails and stores them in a local vector database, to learn your writing style "
+          "and to answer questions about past conversations.")
+    print("Progress is checkpointed, so re-running it only ingests emails sent since the last run.")
     
     try:
         # Initialize the GmailTool, which contains the ingestion logic
         gmail_tool = GmailTool()
         
         # Call the ingestion method
-        # You can change the number to ingest more or fewer emails (e.g., max_emails=100)
-        gmail_tool.ingest_sent_emails(max_emails=50)
+        if args.mode in ('style', 'all'):
+            gmail_tool.ingest_sent_emails(max_emails=args.max_emails)
+        if args.mode in ('content', 'all'):
+            gmail_tool.ingest_email_content(max_emails=args.max_emails)
+
+        embedding_cache = get_embedding_backend().cache
+        if embedding_cache is not None:
+            stats = embedding_cache.stats()
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"(hit rate {stats['hit_rate']:.0%}), {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB on disk.")
         
         print("\n--- Ingestion Process Completed Successfully ---")
         
@@ -26,4 +50,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
@@ -1,37 +1,117 @@
 # digital_twin_agent/run_proactive_assistant.py
 
+import argparse
+import datetime
 import json
-from core.agent import run_agent_with_dynamic_prompt
-from tools.email_tools import GmailTool
-from tools.calendar_tools import GoogleCalendarTool
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-def get_current_context():
+# The agent module builds the tools once; the proactive runner reuses them (and their warm API clients).
+from core.agent import run_agent_with_dynamic_prompt, warmup, gmail_tool, calendar_tool, content_tool
+from core.change_watcher import CalendarWatcher, CallBudget, MailboxWatcher
+
+# --- Daemon Settings ---
+# Seconds between change checks. An idle check costs one Gmail and one Calendar request.
+PROACTIVE_POLL_SECONDS = float(os.getenv('PROACTIVE_POLL_SECONDS', '60'))
+# Changes are batched until none has arrived for this long, so a burst of mail triggers one analysis.
+PROACTIVE_DEBOUNCE_SECONDS = float(os.getenv('PROACTIVE_DEBOUNCE_SECONDS', '120'))
+# The longest a change waits for the burst around it to settle.
+PROACTIVE_MAX_DELAY_SECONDS = float(os.getenv('PROACTIVE_MAX_DELAY_SECONDS', '600'))
+# The maximum number of agent runs per rolling hour; further changes wait for the budget to free up.
+PROACTIVE_MAX_LLM_CALLS_PER_HOUR = int(os.getenv('PROACTIVE_MAX_LLM_CALLS_PER_HOUR', '6'))
+
+# --- Context Settings ---
+# Seconds each context source (mail, calendar, related threads) may take before it is left out.
+CONTEXT_SOURCE_TIMEOUT_SECONDS = float(os.getenv('CONTEXT_SOURCE_TIMEOUT_SECONDS', '15'))
+# Whether to add past email passages related to the unread emails to the context.
+PROACTIVE_RELATED_THREADS = os.getenv('PROACTIVE_RELATED_THREADS', 'true').lower() == 'true'
+RELATED_SNIPPET_CHARS = 200
+
+PROACTIVE_INSTRUCTIONS = (
+    "Analyze this information for potential actions. If you identify a necessary action "
+    "that requires a write-action tool, formulate a plan, present the tool you would use "
+    "and the exact parameters, and ask for permission by ending your response with the "
+    "exact phrase 'Shall I proceed? [y/n]'. If no actions are needed, "
+    "simply state that everything looks clear."
+)
+
+# --- Context Gathering ---
+def _unread_emails() -> list:
+    return gmail_tool.fetch_unread()
+
+def _todays_schedule() -> str:
+    calendar_data = json.loads(calendar_tool.call(params='{}'))
+    if 'error' in calendar_data:
+        raise RuntimeError(calendar_data['error'])
+    return calendar_data.get('schedule') or calendar_data.get('events', 'None')
+
+def _related_threads(unread_future, timeout: float) -> list:
+    """Looks up past email passages related to each unread email's subject, in one batched search."""
+    unread_emails = [email for email in unread_future.result(timeout=timeout) if email['subject'] != 'No Subject']
+    if not unread_emails:
+        return []
+    results = content_tool.vector_store.search_many([email['subject'] for email in unread_emails], n_results=1)
+    related = []
+    for email, result in zip(unread_emails, results):
+        for document, metadata in zip(result['documents'], result['metadatas']):
+            # The unread email itself may already be indexed; it is not "related".
+            if (metadata or {}).get('message_id') != email['id']:
+                snippet = " ".join(document.split())[:RELATED_SNIPPET_CHARS]
+                related.append(f"Re '{email['subject']}': {snippet}")
+    return related
+
+def get_current_context(include_related: bool = PROACTIVE_RELATED_THREADS,
+                        timeout: float = CONTEXT_SOURCE_TIMEOUT_SECONDS):
     """
     Uses the read-only tools to gather the user's current context.
-    
+
+    Mail, calendar and (optionally) related past threads are fetched concurrently, so gathering takes
+    as long as the slowest source rather than the sum of all of them. A source that fails or does not
+    answer within `timeout` seconds is reported as unavailable and the rest of the context is still used.
+
+    Args:
+        include_related (bool): Whether to look up past email passages related to the unread emails.
+        timeout (float): Seconds each source may take, counted from the start of gathering.
+
     Returns:
         str: A formatted string containing a summary of unread emails and upcoming calendar events.
     """
     print("--- Gathering Proactive Context ---")
-    
-    # Initialize the tools to fetch data
-    gmail_tool = GmailTool()
-    calendar_tool = GoogleCalendarTool()
-    
-    # Fetch data from tools
-    email_data_str = gmail_tool.call()
-    calendar_data_str = calendar_tool.call(params='{}')
-    
-    # Parse the JSON strings
-    email_data = json.loads(email_data_str)
-    calendar_data = json.loads(calendar_data_str)
-    
+    start = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='context')
+    futures = {'mail': executor.submit(_unread_emails), 'calendar': executor.submit(_todays_schedule)}
+    if include_related:
+        # Depends on the unread emails, but overlaps with the calendar lookup.
+        futures['related'] = executor.submit(_related_threads, futures['mail'], timeout)
+
+    results, timings = {}, {}
+    for source, future in futures.items():
+        try:
+            results[source] = future.result(timeout=max(0.0, timeout - (time.monotonic() - start)))
+            timings[source] = f"{time.monotonic() - start:.1f}s"
+        except FutureTimeoutError:
+            print(f"Context source '{source}' did not respond within {timeout:.0f}s; continuing without it.")
+            timings[source] = "timed out"
+        except Exception as e:
+            print(f"Context source '{source}' failed: {e}")
+            timings[source] = "failed"
+    # Do not wait for a source that is still hanging; its result is no longer needed.
+    executor.shutdown(wait=False, cancel_futures=True)
+
     # Build a comprehensive context summary string
     context = "Here is a summary of the user's current situation:\n\n"
-    context += f"Unread Emails: {email_data.get('summary', 'None')}\n"
-    context += f"Today's Schedule: {calendar_data.get('schedule', 'None')}\n"
-    
-    print("Context gathering complete.")
+    if 'mail' in results:
+        email_summaries = [f"From: {email['sender']}, Subject: {email['subject']}" for email in results['mail']]
+        context += f"Unread Emails: {'; '.join(email_summaries) or 'None'}\n"
+    else:
+        context += "Unread Emails: (unavailable)\n"
+    context += f"Today's Schedule: {results.get('calendar', '(unavailable)')}\n"
+    if results.get('related'):
+        context += "Related Past Emails: " + "; ".join(results['related']) + "\n"
+
+    print(f"Context gathering complete in {time.monotonic() - start:.1f}s "
+          f"({', '.join(f'{source}: {timing}' for source, timing in timings.items())}).")
     return context
 
 def main():
@@ -47,11 +127,7 @@ def main():
     proactive_prompt = (
         "You are in PROACTIVE mode. Here is the user's current context:\n"
         f"{current_context}\n"
-        "Analyze this information for potential actions. If you identify a necessary action "
-        "that requires a write-action tool, formulate a plan, present the tool you would use "
-        "and the exact parameters, and ask for permission by ending your response with the "
-        "exact phrase 'Shall I proceed? [y/n]'. If no actions are needed, "
-        "simply state that everything looks clear."
+        f"{PROACTIVE_INSTRUCTIONS}"
     )
     
     # 3. Prepare the message history for the agent
@@ -96,5 +172,106 @@ def main():
     else:
         print("The agent did not produce a plan.")
 
+# --- Daemon Mode ---
+def describe_changes(new_emails: list, changed_events: list) -> str:
+    """Formats the items detected by the watchers for the agent's prompt."""
+    lines = []
+    for email in new_emails:
+        lines.append(f"- New email from {email['sender']}: {email['subject']}")
+    for event in changed_events:
+        if event.get('status') == 'cancelled':
+            lines.append(f"- Calendar event cancelled: {event.get('summary', 'an event')}")
+            continue
+        start = event.get('start', {})
+        lines.append(f"- Calendar event added or changed: {event.get('summary', 'No Title')} "
+                     f"at {start.get('dateTime', start.get('date', 'an unknown time'))}")
+    return "\n".join(lines)
+
+def analyze_changes(new_emails: list, changed_events: list):
+    """Runs the agent once over a batch of detected changes and logs its suggestions."""
+    proactive_prompt = (
+        "You are in PROACTIVE mode, running in the background. These items are new since your last check:\n"
+        f"{describe_changes(new_emails, changed_events)}\n\n"
+        f"{get_current_context()}\n"
+        f"{PROACTIVE_INSTRUCTIONS}"
+    )
+    final_response = None
+    # Nobody is there to confirm an action, so the agent is built without the write-action tools.
+    for response in run_agent_with_dynamic_prompt([{'role': 'user', 'content': proactive_prompt}], read_only=True):
+        final_response = response
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"\n--- Proactive Suggestions ({timestamp}) ---")
+    print(final_response[-1]['content'] if final_response else "The agent did not produce a plan.")
+
+def run_daemon(poll_seconds: float = PROACTIVE_POLL_SECONDS, debounce_seconds: float = PROACTIVE_DEBOUNCE_SECONDS,
+               max_delay_seconds: float = PROACTIVE_MAX_DELAY_SECONDS,
+               max_llm_calls_per_hour: int = PROACTIVE_MAX_LLM_CALLS_PER_HOUR):
+    """
+    Watches the mailbox and calendars and runs the agent only when something changed.
+
+    Changes are detected with the Gmail history API and Calendar sync tokens, so an idle check is cheap.
+    Detected items are batched until the burst settles (`debounce_seconds` without new changes, or
+    `max_delay_seconds` after the first one), and agent runs are capped per rolling hour.
+    Suggestions are only printed: the agent runs without the write-action tools, so nothing can be executed.
+    """
+    print("\n--- Running Proactive Digital Twin Assistant (daemon mode) ---")
+    # Load credentials, clients and models once up front; every later check reuses them.
+    warmup()
+    mailbox_watcher = MailboxWatcher(gmail_tool)
+    calendar_watcher = CalendarWatcher(calendar_tool)
+    budget = CallBudget(max_llm_calls_per_hour)
+    pending_emails, pending_events = {}, {}
+    first_change_at = last_change_at = None
+    budget_exhausted_reported = False
+
+    while True:
+        try:
+            new_emails = mailbox_watcher.poll()
+            changed_events = calendar_watcher.poll()
+        except Exception as e:
+            print(f"Change check failed: {e}")
+            new_emails, changed_events = [], []
+
+        now = time.monotonic()
+        if new_emails or changed_events:
+            print(f"Detected {len(new_emails)} new emails and {len(changed_events)} calendar changes.")
+            pending_emails.update((email['id'], email) for email in new_emails)
+            # A later change to the same event replaces the earlier one.
+            pending_events.update(((event['calendar_id'], event['id']), event) for event in changed_events)
+            first_change_at = first_change_at or now
+            last_change_at = now
+
+        settled = first_change_at is not None and (
+            now - last_change_at >= debounce_seconds or now - first_change_at >= max_delay_seconds
+        )
+        if settled:
+            if budget.try_acquire():
+                try:
+                    analyze_changes(list(pending_emails.values()), list(pending_events.values()))
+                except Exception as e:
+                    print(f"Proactive analysis failed: {e}")
+                pending_emails.clear()
+                pending_events.clear()
+                first_change_at = last_change_at = None
+                budget_exhausted_reported = False
+            elif not budget_exhausted_reported:
+                # Pending changes are kept and analyzed together once the budget allows.
+                print(f"Hourly agent budget used up; next analysis in about "
+                      f"{budget.seconds_until_available() / 60:.0f} minutes.")
+                budget_exhausted_reported = True
+
+        time.sleep(poll_seconds)
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Suggest actions based on the user's mail and calendar.")
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and analyze new mail and calendar changes as they arrive.')
+    parser.add_argument('--poll-interval', type=float, default=PROACTIVE_POLL_SECONDS,
+                        help='Seconds between change checks in daemon mode.')
+    parser.add_argument('--max-llm-calls-per-hour', type=int, default=PROACTIVE_MAX_LLM_CALLS_PER_HOUR,
+                        help='The maximum number of agent runs per hour in daemon mode.')
+    args = parser.parse_args()
+    if args.daemon:
+        run_daemon(poll_seconds=args.poll_interval, max_llm_calls_per_hour=args.max_llm_calls_per_hour)
+    else:
+        main()
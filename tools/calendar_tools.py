@@ -1,52 +1,137 @@
 # digital_twin_agent/tools/calendar_tools.py
 
 import datetime
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import dateutil.parser
-from googleapiclient.discovery import build
 
-from core.auth import get_google_credentials
+from core.auth import get_service
+from core.calendar_cache import event_sort_key, get_calendar_cache
 from qwen_agent.tools.base import BaseTool
 
+# --- Calendar Reader Settings ---
+# Comma-separated calendar IDs to read, e.g. "primary,team@group.calendar.google.com".
+CALENDAR_IDS = [c.strip() for c in os.getenv('CALENDAR_IDS', 'primary').split(',') if c.strip()]
+# The longest range a single tool call may cover.
+MAX_RANGE_DAYS = int(os.getenv('CALENDAR_MAX_RANGE_DAYS', '31'))
+
 class GoogleCalendarTool(BaseTool):
     name = 'google_calendar_reader'
     description = (
-        'Retrieves Google Calendar events for a specified date to answer questions about '
-        'schedules, appointments, meetings, and plans. If no date is mentioned, '
-        'it defaults to today.'
+        'Retrieves Google Calendar events for a date or a date range to answer questions about '
+        'schedules, appointments, meetings, and plans. Use `start_date` and `end_date` for questions '
+        'about several days (e.g. "this week") instead of calling the tool once per day. '
+        'If no date is mentioned, it defaults to today.'
     )
     parameters = [{
         'name': 'date',
         'type': 'string',
-        'description': 'The date to retrieve events for, in YYYY-MM-DD format.',
+        'description': 'A single date to retrieve events for, in YYYY-MM-DD format.',
+        'required': False
+    }, {
+        'name': 'start_date',
+        'type': 'string',
+        'description': 'The first day of a range to retrieve events for, in YYYY-MM-DD format.',
+        'required': False
+    }, {
+        'name': 'end_date',
+        'type': 'string',
+        'description': 'The last day (inclusive) of a range to retrieve events for, in YYYY-MM-DD format.',
         'required': False
     }]
 
     def __init__(self, cfg=None):
         super().__init__(cfg)
-        creds = get_google_credentials()
-        self.service = build('calendar', 'v3', credentials=creds)
+        cfg = cfg or {}
+        self.calendar_ids = cfg.get('calendar_ids', CALENDAR_IDS)
+
+    @property
+    def service(self):
+        """The Calendar API client for the calling thread."""
+        return get_service('calendar', 'v3')
 
     def call(self, params: str, **kwargs) -> str:
         try:
             params_dict = self._parse_params(params)
-            date_str = params_dict.get('date')
-            target_date = dateutil.parser.isoparse(date_str).date() if date_str else datetime.date.today()
-            time_min = datetime.datetime.combine(target_date, datetime.time.min).isoformat() + 'Z'
-            time_max = datetime.datetime.combine(target_date, datetime.time.max).isoformat() + 'Z'
-
-            events_result = self.service.events().list(
-                calendarId='primary', timeMin=time_min, timeMax=time_max,
-                maxResults=20, singleEvents=True, orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
+            first_day, last_day = self._date_range(params_dict)
+            if (last_day - first_day).days >= MAX_RANGE_DAYS:
+                return json.dumps({"error": f"The date range may cover at most {MAX_RANGE_DAYS} days."})
 
+            events, errors = self.fetch_events(first_day, last_day)
+            period = first_day.strftime('%Y-%m-%d') if first_day == last_day else \
+                f"{first_day.strftime('%Y-%m-%d')} to {last_day.strftime('%Y-%m-%d')}"
+            if not events and errors:
+                return json.dumps({"error": "; ".join(errors)})
             if not events:
-                return f'{{"events": "No upcoming events found on {target_date.strftime("%Y-%m-%d")}."}}'
+                return json.dumps({"events": f"No upcoming events found on {period}."})
 
-            event_list = [f"- {dateutil.parser.isoparse(event['start'].get('dateTime', event['start'].get('date'))).strftime('%I:%M %p' if event['start'].get('dateTime') else 'All-day')}: {event.get('summary', 'No Title')}" for event in events]
-            return f'{{"events": "{len(event_list)} events scheduled", "schedule": "{"; ".join(event_list)}"}}'
+            multi_day = first_day != last_day
+            result = {
+                "events": f"{len(events)} events scheduled",
+                "schedule": "; ".join(self._format_event(event, calendar_id, multi_day) for calendar_id, event in events)
+            }
+            if errors:
+                result["errors"] = "; ".join(errors)
+            return json.dumps(result)
         except Exception as e:
-            return f'{{"error": "An error occurred: {str(e)}"}}'
+            return json.dumps({"error": f"An error occurred: {str(e)}"})
+
+    def fetch_events(self, first_day: datetime.date, last_day: datetime.date) -> tuple[list, list]:
+        """
+        Reads every configured calendar for a range of days, concurrently when there are several.
+
+        Args:
+            first_day (datetime.date): The first day of the range.
+            last_day (datetime.date): The last day of the range (inclusive).
+
+        Returns:
+            tuple[list, list]: The (calendar_id, event) pairs of all calendars sorted by start time,
+                and an error message for each calendar that could not be read.
+        """
+        def read_calendar(calendar_id):
+            # Runs on a worker thread, so it uses that thread's own API client.
+            try:
+                return calendar_id, get_calendar_cache(calendar_id).get_range(self.service, first_day, last_day), None
+            except Exception as e:
+                return calendar_id, [], e
+
+        if len(self.calendar_ids) == 1:
+            outcomes = [read_calendar(self.calendar_ids[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.calendar_ids)) as executor:
+                outcomes = list(executor.map(read_calendar, self.calendar_ids))
+
+        events, errors = [], []
+        for calendar_id, calendar_events, error in outcomes:
+            if error is not None:
+                print(f"[Error in GoogleCalendarTool]: Could not read calendar '{calendar_id}': {error}")
+                errors.append(f"Could not read calendar '{calendar_id}': {error}")
+            events.extend((calendar_id, event) for event in calendar_events)
+        events.sort(key=lambda pair: event_sort_key(pair[1]))
+        return events, errors
+
+    def _date_range(self, params_dict: dict) -> tuple[datetime.date, datetime.date]:
+        """Resolves the requested days from `start_date`/`end_date`, or `date`, or today."""
+        start_str = params_dict.get('start_date') or params_dict.get('date')
+        end_str = params_dict.get('end_date')
+        first_day = dateutil.parser.isoparse(start_str).date() if start_str else datetime.date.today()
+        last_day = dateutil.parser.isoparse(end_str).date() if end_str else first_day
+        if last_day < first_day:
+            first_day, last_day = last_day, first_day
+        return first_day, last_day
+
+    def _format_event(self, event: dict, calendar_id: str, multi_day: bool) -> str:
+        start = event['start']
+        start_time = dateutil.parser.isoparse(start.get('dateTime', start.get('date')))
+        when = start_time.strftime('%I:%M %p') if start.get('dateTime') else 'All-day'
+        if multi_day:
+            when = f"{start_time.strftime('%a %Y-%m-%d')} {when}"
+        line = f"- {when}: {event.get('summary', 'No Title')}"
+        if len(self.calendar_ids) > 1:
+            line += f" ({calendar_id})"
+        return line
 
     def _parse_params(self, params: str) -> dict:
         import json
@@ -1,7 +1,21 @@
 # digital_twin_agent/tools/content_retriever_tool.py
 
+import datetime
+import os
+import dateutil.parser
+from email.utils import parseaddr
+
 from qwen_agent.tools.base import BaseTool
-from core.vector_store_manager import VectorStoreManager
+from core.vector_store_manager import get_vector_store
+from core.mailbox_mirror import get_mailbox_mirror
+
+# 'hybrid' fuses semantic search with a keyword search of the local mailbox mirror; 'vector' uses semantic search only.
+CONTENT_SEARCH_MODE = os.getenv('CONTENT_SEARCH_MODE', 'hybrid').lower()
+CONTENT_RESULTS = int(os.getenv('CONTENT_RESULTS', '4'))
+# Results fetched before near-duplicate passages (e.g. the same text quoted across a thread) are filtered out.
+CONTENT_CANDIDATES = int(os.getenv('CONTENT_CANDIDATES', '12'))
+# Cap on the combined size of the passages returned to the LLM, in tokens.
+CONTENT_TOKEN_BUDGET = int(os.getenv('CONTENT_TOKEN_BUDGET', '1500'))
 
 class ContentRetrieverTool(BaseTool):
     """
@@ -20,13 +34,37 @@ class ContentRetrieverTool(BaseTool):
         'type': 'string',
         'description': 'The user\'s original, verbatim question about the email content.', # The LLM should pass the user's raw question.
         'required': True
+    }, {
+        'name': 'sender',
+        'type': 'string',
+        'description': 'Only search emails from this email address.',
+        'required': False
+    }, {
+        'name': 'after_date',
+        'type': 'string',
+        'description': 'Only search emails sent on or after this date, in YYYY-MM-DD format.',
+        'required': False
+    }, {
+        'name': 'before_date',
+        'type': 'string',
+        'description': 'Only search emails sent on or before this date, in YYYY-MM-DD format.',
+        'required': False
     }]
 
     def __init__(self, cfg=None):
         super().__init__(cfg)
-        self.vector_store = VectorStoreManager(collection_name="email_content_collection") # Use a dedicated collection
         print("Content Retriever tool initialized successfully.")
 
+    @property
+    def vector_store(self):
+        """The dedicated email content collection, opened on first use."""
+        return get_vector_store(collection_name="email_content_collection")
+
+    @property
+    def mirror(self):
+        """The local mailbox mirror used for keyword search."""
+        return get_mailbox_mirror()
+
     def call(self, params: str, **kwargs) -> str:
         """
         Searches the vector store for email content matching the user's query.
@@ -40,7 +78,28 @@ class ContentRetrieverTool(BaseTool):
 
             # IMPROVEMENT: We now use the user's raw query for the search, which is often more robust.
             print(f"Tool Action: Searching for content semantically similar to: '{query}'")
-            search_results = self.vector_store.search(query_text=query, n_results=4) # Retrieve more results for context
+            bounds = self._parse_bounds(
+                params_dict.get('sender'), params_dict.get('after_date'), params_dict.get('before_date')
+            )
+            where = self._build_filter(**bounds)
+            # Until ingestion has populated the mirror there is nothing to fuse with.
+            if CONTENT_SEARCH_MODE == 'hybrid' and self.mirror.count():
+                hits = self.vector_store.hybrid_search(
+                    query, self.mirror, n_results=CONTENT_CANDIDATES, where=where,
+                    keyword_filters={key: value for key, value in bounds.items() if value is not None}
+                )
+                candidates = [self._format_hit(hit) for hit in hits]
+                # Diversify by content, but rank by the fused score so keyword-only matches are kept.
+                picks = self.vector_store.rerank(
+                    query, [hit['document'] for hit in hits], k=CONTENT_RESULTS, token_budget=CONTENT_TOKEN_BUDGET,
+                    relevance=[hit['score'] for hit in hits]
+                )
+                search_results = [candidates[i] for i in picks]
+            else:
+                search_results = self.vector_store.search_diverse(
+                    query, n_results=CONTENT_RESULTS, candidates=CONTENT_CANDIDATES, where=where,
+                    token_budget=CONTENT_TOKEN_BUDGET
+                )
 
             if not search_results:
                 return '{"retrieved_content": "No relevant information found in your emails matching that query."}'
@@ -55,6 +114,39 @@ class ContentRetrieverTool(BaseTool):
             print(f"[Error in ContentRetrieverTool]: {e}")
             return f'{{"error": "An error occurred while retrieving email content: {str(e)}"}}'
 
+    def _parse_bounds(self, sender: str = None, after_date: str = None, before_date: str = None) -> dict:
+        """Normalises an optional sender address and YYYY-MM-DD date bounds to a lowercased address and epoch seconds."""
+        bounds = {'sender': None, 'after': None, 'before': None}
+        if sender:
+            bounds['sender'] = parseaddr(sender)[1].lower()
+        if after_date:
+            start = datetime.datetime.combine(dateutil.parser.isoparse(after_date).date(), datetime.time.min)
+            bounds['after'] = int(start.timestamp())
+        if before_date:
+            end = datetime.datetime.combine(dateutil.parser.isoparse(before_date).date(), datetime.time.max)
+            bounds['before'] = int(end.timestamp())
+        return bounds
+
+    def _build_filter(self, sender: str = None, after: int = None, before: int = None) -> dict:
+        """Builds a Chroma `where` filter from the bounds returned by `_parse_bounds`."""
+        conditions = []
+        if sender:
+            conditions.append({'from': sender})
+        if after is not None:
+            conditions.append({'date': {'$gte': after}})
+        if before is not None:
+            conditions.append({'date': {'$lte': before}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+    def _format_hit(self, hit: dict) -> str:
+        """Prefixes a hybrid search hit with its sender, date and subject, so the LLM can attribute it."""
+        metadata = hit['metadata']
+        date = datetime.date.fromtimestamp(metadata['date']).isoformat() if metadata.get('date') else 'unknown'
+        return (f"From: {metadata.get('from') or 'unknown'} | Date: {date} | "
+                f"Subject: {metadata.get('subject') or '(no subject)'}\n{hit['document']}")
+
     def _parse_params(self, params: str) -> dict:
         """A simple helper to parse the string-based parameters."""
         import json
@@ -1,95 +1,484 @@
 # digital_twin_agent/tools/email_tools.py
 
-import base64
-import re
-from googleapiclient.discovery import build
+import json
+import os
+import random
+import time
+from email.utils import getaddresses
+from googleapiclient.errors import HttpError
 
-from core.auth import get_google_credentials
+from core.auth import get_service
 from qwen_agent.tools.base import BaseTool
-from core.vector_store_manager import VectorStoreManager
+from core.vector_store_manager import get_vector_store
+from core.mailbox_mirror import get_mailbox_mirror
+from core.sync_checkpoint import SyncCheckpoint
+from core.ingestion_pipeline import IngestionPipeline, print_pipeline_stats
+from core.text_chunking import chunk_text, content_hash
+from core.email_text import extract_clean_text
+
+# --- Unread Inbox Settings ---
+# How many unread emails `gmail_reader` summarises when the caller does not say otherwise.
+DEFAULT_UNREAD_WINDOW = 10
+# Gmail rejects batches of more than 100 calls and starts rate limiting well before that,
+# so metadata lookups are grouped into batches of this size.
+METADATA_BATCH_SIZE = 50
+# Gmail allows 250 quota units per user per second and messages.get costs 5, so one batch of
+# METADATA_BATCH_SIZE lookups already uses a second's worth. More concurrent fetchers mostly buy 429s.
+FETCH_WORKERS = int(os.getenv('GMAIL_FETCH_WORKERS', '1'))
+# Rate-limited lookups are retried this many times, waiting FETCH_BACKOFF_SECONDS, then twice that, and so on.
+FETCH_MAX_RETRIES = int(os.getenv('GMAIL_FETCH_RETRIES', '5'))
+FETCH_BACKOFF_SECONDS = 1.0
+# messages.list never returns more than 500 IDs per page.
+MAX_LIST_PAGE_SIZE = 500
+# Ingestion persists its checkpoint after this many batches. Documents are upserted,
+# so anything re-done after a crash is simply overwritten.
+CHECKPOINT_EVERY_BATCHES = 10
+
+
+def list_message_ids(service, query: str, max_results: int = None) -> list[str]:
+    """
+    Lists message IDs matching a Gmail search query, following pagination.
+
+    Args:
+        service: An authorized Gmail API service object.
+        query (str): The Gmail search query (e.g. 'is:unread').
+        max_results (int): The maximum number of IDs to return. None lists every match.
+
+    Returns:
+        list[str]: The matching message IDs, newest first.
+    """
+    message_ids = []
+    page_token = None
+    while max_results is None or len(message_ids) < max_results:
+        page_size = MAX_LIST_PAGE_SIZE if max_results is None else min(MAX_LIST_PAGE_SIZE, max_results - len(message_ids))
+        results = service.users().messages().list(
+            userId='me', q=query, pageToken=page_token, maxResults=page_size
+        ).execute()
+        message_ids.extend(m['id'] for m in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return message_ids if max_results is None else message_ids[:max_results]
+
+
+def _is_rate_limited(error: HttpError) -> bool:
+    """Whether a Gmail error is transient: a rate limit, an exceeded quota or a server error."""
+    status = error.resp.status
+    if status == 403:
+        # Gmail reports exceeded quotas as 403 with a 'rateLimitExceeded' or 'userRateLimitExceeded' reason.
+        return b'ratelimitexceeded' in (error.content or b'').lower()
+    return status == 429 or status >= 500
+
+
+def batch_get_messages(service, message_ids: list[str], **get_kwargs) -> dict:
+    """
+    Fetches many messages using Gmail batch HTTP requests. Each batch of up to
+    METADATA_BATCH_SIZE lookups costs a single round trip instead of one per message.
+    Lookups that were rate limited are retried with exponential backoff.
+
+    Args:
+        service: An authorized Gmail API service object.
+        message_ids (list[str]): The IDs of the messages to fetch.
+        **get_kwargs: Extra arguments for `messages.get`, e.g. format='metadata'.
+
+    Returns:
+        dict: The fetched message resources keyed by message ID. Failed lookups are logged and omitted.
+    """
+    fetched = {}
+    rate_limited = {}
+
+    def _on_response(request_id, response, exception):
+        if exception is None:
+            fetched[request_id] = response
+        elif isinstance(exception, HttpError) and _is_rate_limited(exception):
+            rate_limited[request_id] = exception
+        else:
+            print(f"Could not fetch message {request_id}: {exception}")
+
+    pending = list(message_ids)
+    for attempt in range(FETCH_MAX_RETRIES + 1):
+        for start in range(0, len(pending), METADATA_BATCH_SIZE):
+            chunk = pending[start:start + METADATA_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=_on_response)
+            for message_id in chunk:
+                batch.add(service.users().messages().get(userId='me', id=message_id, **get_kwargs), request_id=message_id)
+            try:
+                batch.execute()
+            except HttpError as e:
+                # The whole batch was refused, e.g. with a 429.
+                if not _is_rate_limited(e):
+                    raise
+                rate_limited.update((message_id, e) for message_id in chunk if message_id not in fetched)
+        if not rate_limited or attempt == FETCH_MAX_RETRIES:
+            break
+        delay = FETCH_BACKOFF_SECONDS * 2 ** attempt * random.uniform(1.0, 1.5)
+        print(f"Gmail rate limited {len(rate_limited)} lookups; retrying in {delay:.1f}s...")
+        time.sleep(delay)
+        pending = list(rate_limited)
+        rate_limited.clear()
+
+    for message_id, exception in rate_limited.items():
+        print(f"Could not fetch message {message_id} after {FETCH_MAX_RETRIES} retries: {exception}")
+    return fetched
+
+
+def fetch_message_metadata(service, message_ids: list[str], headers=('Subject', 'From')) -> list[dict]:
+    """
+    Fetches selected headers for many messages in batched round trips.
+
+    Args:
+        service: An authorized Gmail API service object.
+        message_ids (list[str]): The IDs of the messages to look up.
+        headers (tuple[str]): The header names to request.
+
+    Returns:
+        list[dict]: One dict per message that was fetched successfully, in the order of `message_ids`,
+            holding the message 'id' and the requested headers (missing headers are omitted).
+    """
+    fetched = batch_get_messages(service, message_ids, format='metadata', metadataHeaders=list(headers))
+    metadata = []
+    for message_id in message_ids:
+        if message_id in fetched:
+            message_headers = fetched[message_id].get('payload', {}).get('headers', [])
+            metadata.append({'id': message_id, **{h['name']: h['value'] for h in message_headers if h['name'] in headers}})
+    return metadata
+
+
+def message_ids_since(service, start_history_id: str, label_ids: tuple) -> tuple[list[str], str]:
+    """
+    Lists the IDs of messages added under any of `label_ids` after a mailbox history position.
+
+    Args:
+        service: An authorized Gmail API service object.
+        start_history_id (str): The historyId to list changes from.
+        label_ids (tuple[str]): The labels of interest, e.g. ('INBOX',).
+
+    Returns:
+        tuple[list[str], str]: The new message IDs and the mailbox's current historyId.
+
+    Raises:
+        HttpError: With status 404 if the history position has expired.
+    """
+    message_ids = {}
+    page_token = None
+    # history.list filters on at most one label; with several, filter the records client-side instead.
+    label_filter = {'labelId': label_ids[0]} if len(label_ids) == 1 else {}
+    while True:
+        response = service.users().history().list(
+            userId='me', startHistoryId=start_history_id, historyTypes=['messageAdded'],
+            pageToken=page_token, **label_filter
+        ).execute()
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                if set(label_ids) & set(message.get('labelIds', [])):
+                    message_ids[message['id']] = None
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return list(message_ids), response['historyId']
+
+
+def _addresses(header_value: str) -> list[str]:
+    """Returns the lowercased email addresses in an address header such as To or From."""
+    return [address.lower() for _, address in getaddresses([header_value or '']) if address]
+
+
+def recipient_key(address: str) -> str:
+    """
+    Returns the metadata key flagging that `address` received an email. Chroma cannot filter by membership
+    in a list or string, so every To/Cc recipient gets its own boolean key, e.g. {'to:alice@example.com': True}.
+    """
+    return f'to:{address.lower()}'
+
+
+def build_email_metadata(msg: dict, cleaned_text: str) -> dict:
+    """
+    Builds the structured metadata stored next to an email's text in the vector store,
+    so retrieval can be filtered by recipient, sender, date or thread.
+
+    Args:
+        msg (dict): A full-format Gmail message resource.
+        cleaned_text (str): The email's cleaned body.
+
+    Returns:
+        dict: Scalar metadata values, as required by ChromaDB. 'to' holds the primary recipient,
+            'to_all' every recipient, 'date' the epoch seconds at which Gmail received the message,
+            and 'label_ids' a comma-separated list. Each recipient also gets a `recipient_key` flag.
+    """
+    headers = {h['name'].lower(): h['value'] for h in msg.get('payload', {}).get('headers', [])}
+    recipients = _addresses(headers.get('to')) + _addresses(headers.get('cc'))
+    senders = _addresses(headers.get('from'))
+    return {
+        'message_id': msg['id'],
+        'to': recipients[0] if recipients else '',
+        'to_all': ','.join(recipients),
+        'from': senders[0] if senders else '',
+        'subject': headers.get('subject', ''),
+        'date': int(msg.get('internalDate', 0)) // 1000,
+        'thread_id': msg.get('threadId', ''),
+        'label_ids': ','.join(msg.get('labelIds', [])),
+        'word_count': len(cleaned_text.split()),
+        **{recipient_key(address): True for address in recipients}
+    }
+
 
 class GmailTool(BaseTool):
     """A synchronous tool for reading from the Gmail API."""
     name = 'gmail_reader'
     description = 'Retrieves the sender and subject of recent unread emails.'
-    parameters = []
+    parameters = [{
+        'name': 'max_results',
+        'type': 'integer',
+        'description': 'The maximum number of unread emails to summarize. Defaults to 10.',
+        'required': False
+    }]
 
     def __init__(self, cfg=None):
         super().__init__(cfg)
-        creds = get_google_credentials()
-        self.service = build('gmail', 'v1', credentials=creds)
-        self.vector_store = VectorStoreManager()
+        # The unread window can be tuned per instance, e.g. GmailTool({'unread_window': 25}).
+        self.unread_window = int(self.cfg.get('unread_window', DEFAULT_UNREAD_WINDOW))
         print("Gmail tool initialized successfully.")
 
     def call(self, params: str = None, **kwargs) -> str:
         """The main synchronous method executed by the agent."""
         try:
+            params_dict = self._parse_params(params)
+            max_results = int(params_dict.get('max_results') or self.unread_window)
+
             print("Tool Action: Fetching unread emails...")
-            results = self.service.users().messages().list(userId='me', q='is:unread', maxResults=10).execute()
-            messages = results.get('messages', [])
+            unread_emails = self.fetch_unread(max_results)
 
-            if not messages:
+            if not unread_emails:
                 return '{"status": "No unread emails found."}'
 
-            email_summaries = []
-            for message in messages:
-                msg = self.service.users().messages().get(userId='me', id=message['id'], format='metadata').execute()
-                headers = msg['payload']['headers']
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-                sender_name = sender.split('<')[0].strip()
-                email_summaries.append(f"From: {sender_name}, Subject: {subject}")
-
-            return f'{{"status": "{len(email_summaries)} unread emails found.", "summary": "{"; ".join(email_summaries)}"}}'
+            email_summaries = [f"From: {email['sender']}, Subject: {email['subject']}" for email in unread_emails]
+            return json.dumps({
+                "status": f"{len(email_summaries)} unread emails found.",
+                "summary": "; ".join(email_summaries)
+            })
         except Exception as e:
             return f'{{"error": "An error occurred: {str(e)}"}}'
 
+    def fetch_unread(self, max_results: int = None) -> list[dict]:
+        """
+        Fetches the sender name and subject of the most recent unread emails.
+
+        Args:
+            max_results (int): The size of the unread window. Defaults to the tool's configured window.
+
+        Returns:
+            list[dict]: One dict per email with 'id', 'sender' and 'subject' keys, newest first.
+        """
+        message_ids = list_message_ids(self.service, 'is:unread', max_results or self.unread_window)
+        unread_emails = []
+        for metadata in fetch_message_metadata(self.service, message_ids):
+            sender = metadata.get('From', 'Unknown Sender')
+            unread_emails.append({
+                'id': metadata['id'],
+                'sender': sender.split('<')[0].strip(),
+                'subject': metadata.get('Subject', 'No Subject')
+            })
+        return unread_emails
+
     # The ingestion logic remains synchronous as it's a one-off script
-    def ingest_sent_emails(self, max_emails=50):
-        print(f"Starting ingestion of up to {max_emails} sent emails...")
+    def ingest_sent_emails(self, max_emails=None):
+        """
+        Ingests sent emails into the writing style collection, incrementally.
+
+        The first run pages through the whole sent folder. Every batch that reaches the vector store is
+        recorded in a checkpoint, so an interrupted run resumes where it stopped. Once a full pass has
+        finished, later runs ask the Gmail history API for messages sent since the stored historyId and
+        only fetch and embed those.
+
+        Args:
+            max_emails (int): Optional cap on how many new emails to ingest in this run. A capped full
+                pass is continued on the next run.
+        """
+        print("--- Ingesting sent emails into the writing style collection ---")
+        self._sync_mailbox(
+            checkpoint_name='sent_mail', query='in:sent', label_ids=('SENT',),
+            vector_store=self.vector_store, build_documents=self._style_documents, max_emails=max_emails
+        )
+
+    def ingest_email_content(self, max_emails=None):
+        """
+        Indexes received and sent emails into the content collection used by `email_content_retriever`.
+
+        Bodies are split into overlapping chunks that fit the embedding model's input limit. Each chunk is
+        stored under a hash of its text, so a passage repeated across a thread is only indexed once.
+        Headers and cleaned bodies are also written to the local mailbox mirror for keyword search.
+        Uses the same incremental, checkpointed sync as `ingest_sent_emails`.
+
+        Args:
+            max_emails (int): Optional cap on how many new emails to ingest in this run.
+        """
+        print("--- Ingesting received and sent emails into the content collection ---")
+        self._sync_mailbox(
+            checkpoint_name='email_content', query='in:inbox OR in:sent', label_ids=('INBOX', 'SENT'),
+            vector_store=self.content_store, build_documents=self._content_documents, max_emails=max_emails,
+            skip_existing=True, mirror=get_mailbox_mirror()
+        )
+        print(f"The content index now holds {self.content_store.count()} chunks "
+              f"and the mailbox mirror {get_mailbox_mirror().count()} emails.")
+
+    def _sync_mailbox(self, checkpoint_name, query, label_ids, vector_store, build_documents,
+                      max_emails=None, skip_existing=False, mirror=None):
+        """
+        Incrementally syncs the messages matching `query` into `vector_store` through the ingestion pipeline.
+
+        Args:
+            checkpoint_name (str): The name of the SyncCheckpoint tracking this sync.
+            query (str): The Gmail search query used for a full pass.
+            label_ids (tuple[str]): The labels whose new messages are picked up in a delta sync.
+            vector_store (VectorStoreManager): The collection to write to.
+            build_documents (callable): Takes a full-format message and its cleaned body and returns
+                a list of (document_id, text, metadata) tuples to store.
+            max_emails (int): Optional cap on how many new emails to process in this run.
+            skip_existing (bool): Whether to leave documents whose ID is already stored untouched.
+            mirror (MailboxMirror): Optional mailbox mirror that also receives each email's headers and body.
+        """
+        checkpoint = SyncCheckpoint(checkpoint_name)
         try:
-            sent_messages = self.service.users().messages().list(userId='me', q='in:sent', maxResults=max_emails).execute()
-            messages = sent_messages.get('messages', [])
-            
-            if not messages:
-                print("No sent emails found to ingest.")
+            message_ids, history_id = None, None
+            if checkpoint.full_sync_complete and checkpoint.history_id:
+                try:
+                    message_ids, history_id = message_ids_since(self.service, checkpoint.history_id, label_ids)
+                    print(f"Delta sync: {len(message_ids)} new emails since the last run.")
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    # Gmail only keeps about a week of history; an expired position needs a full pass.
+                    print("Stored history position has expired. Falling back to a full sync...")
+                    checkpoint.reset()
+
+            if message_ids is None:
+                # Snapshot the history position before listing so mail arriving during the pass is not missed.
+                history_id = self.service.users().getProfile(userId='me').execute()['historyId']
+                message_ids = list_message_ids(self.service, query)
+                print(f"Full sync: {len(message_ids)} emails match '{query}'.")
+
+            pending_ids = [m for m in message_ids if m not in checkpoint.processed_ids]
+            truncated = max_emails is not None and len(pending_ids) > max_emails
+            if truncated:
+                pending_ids = pending_ids[:max_emails]
+
+            if not pending_ids:
+                print("No new emails to ingest.")
+
+            progress = {'added': 0, 'batches': 0, 'all_fetched': True}
+
+            def _write_batch(items):
+                # Later duplicates within the batch are dropped; the first occurrence keeps its metadata.
+                documents, mirror_rows = {}, []
+                for _, processed, _ in items:
+                    # Messages that could not be fetched or processed carry no documents.
+                    built, mirror_row = processed or ([], None)
+                    for document_id, text, metadata in built:
+                        documents.setdefault(document_id, (text, metadata))
+                    if mirror_row:
+                        mirror_rows.append(mirror_row)
+                if skip_existing:
+                    for document_id in vector_store.existing_ids(list(documents)):
+                        del documents[document_id]
+                if documents and not vector_store.add_documents(
+                    documents=[text for text, _ in documents.values()],
+                    ids=list(documents),
+                    metadatas=[metadata for _, metadata in documents.values()]
+                ):
+                    return False
+                if mirror is not None:
+                    mirror.upsert_many(mirror_rows)
+                # Only messages that were actually fetched count as processed; failed lookups are retried next run.
+                checkpoint.mark_processed(message_id for message_id, _, fetched in items if fetched)
+                progress['all_fetched'] = progress['all_fetched'] and all(fetched for _, _, fetched in items)
+                progress['added'] += len(documents)
+                progress['batches'] += 1
+                if progress['batches'] % CHECKPOINT_EVERY_BATCHES == 0:
+                    checkpoint.save()
+                print(f"Processed {len(checkpoint.processed_ids)} emails so far...")
+                return True
+
+            pipeline = IngestionPipeline(
+                fetch_fn=lambda ids: batch_get_messages(self.service, ids),
+                process_fn=lambda message_id, msg: self._process_message(msg, build_documents, mirror is not None),
+                sink_fn=_write_batch,
+                fetch_workers=FETCH_WORKERS,
+                fetch_chunk_size=METADATA_BATCH_SIZE
+            )
+            result = pipeline.run(pending_ids)
+            if pending_ids:
+                print_pipeline_stats(result)
+
+            if not result['completed']:
+                checkpoint.save()
+                print("Stopping ingestion; the next run will resume from the last checkpoint.")
                 return
 
-            documents_to_add = []
-            ids_to_add = []
-
-            for i, message in enumerate(messages):
-                msg = self.service.users().messages().get(userId='me', id=message['id']).execute()
-                payload = msg.get('payload')
-                if payload and payload.get('parts'):
-                    body_data = self._find_plain_text_part(payload['parts'])
-                    if body_data:
-                        text = base64.urlsafe_b64decode(body_data).decode('utf-8')
-                        cleaned_text = self._clean_email_text(text)
-                        
-                        if cleaned_text and len(cleaned_text.split()) > 10:
-                            documents_to_add.append(cleaned_text)
-                            ids_to_add.append(msg['id'])
-                
-                print(f"Processed email {i+1}/{len(messages)}...")
-
-            self.vector_store.add_documents(documents=documents_to_add, ids=ids_to_add)
-            print(f"Ingestion complete. Added {len(documents_to_add)} emails to the knowledge base.")
+            # The history position only advances once every pending email made it in.
+            if not truncated and progress['all_fetched']:
+                checkpoint.history_id = history_id
+                checkpoint.full_sync_complete = True
+            checkpoint.save()
+            print(f"Ingestion complete. Added {progress['added']} documents to the knowledge base.")
 
         except Exception as e:
             print(f"An error occurred during email ingestion: {e}")
-    
-    def _find_plain_text_part(self, parts):
-        for part in parts:
-            if part.get('mimeType') == 'text/plain' and 'data' in part['body']:
-                return part['body']['data']
-            if 'parts' in part:
-                result = self._find_plain_text_part(part['parts'])
-                if result:
-                    return result
-        return None
-
-    def _clean_email_text(self, text: str) -> str:
-        text = re.split(r'\n>|On .* wrote:', text)[0]
-        text = text.split('-- \n')[0]
-        return text.strip()
+
+    def _process_message(self, msg, build_documents, with_mirror_row: bool) -> tuple[list, dict]:
+        """
+        Cleans a fetched message's body once and derives everything stored from it.
+
+        Returns:
+            tuple[list, dict]: The documents from `build_documents`, and the mailbox mirror row
+                (None if not requested or the email has no text body).
+        """
+        cleaned_text = self._extract_clean_text(msg)
+        mirror_row = None
+        if with_mirror_row and cleaned_text:
+            mirror_row = {**build_email_metadata(msg, cleaned_text), 'body': cleaned_text}
+        return build_documents(msg, cleaned_text), mirror_row
+
+    def _style_documents(self, msg, cleaned_text) -> list:
+        """Returns the email as a single writing style example, or nothing if it is too short."""
+        if cleaned_text and len(cleaned_text.split()) > 10:
+            return [(msg['id'], cleaned_text, build_email_metadata(msg, cleaned_text))]
+        return []
+
+    def _content_documents(self, msg, cleaned_text) -> list:
+        """Returns the email's new (non-quoted) text as overlapping chunks keyed by content hash."""
+        if not cleaned_text:
+            return []
+        metadata = build_email_metadata(msg, cleaned_text)
+        chunks = chunk_text(cleaned_text)
+        return [
+            (content_hash(chunk), chunk, {**metadata, 'chunk_index': i, 'chunk_count': len(chunks)})
+            for i, chunk in enumerate(chunks)
+        ]
+
+    @property
+    def vector_store(self):
+        """The writing style collection, opened on first use."""
+        return get_vector_store()
+
+    @property
+    def content_store(self):
+        """The email content collection, opened on first use."""
+        return get_vector_store(collection_name="email_content_collection")
+
+    @property
+    def service(self):
+        """
+        The Gmail API client for the calling thread.
+        The underlying httplib2 connection is not thread-safe, so concurrent fetchers each use their own.
+        """
+        return get_service('gmail', 'v1')
+
+    def _extract_clean_text(self, msg) -> str:
+        """Returns the cleaned body of a full-format message (plain text, or HTML converted to text), or None if it has none."""
+        return extract_clean_text(msg)
+
+    def _parse_params(self, params: str) -> dict:
+        try:
+            return json.loads(params)
+        except (json.JSONDecodeError, TypeError):
+            return {}
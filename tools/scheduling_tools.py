@@ -0,0 +1,169 @@
+# digital_twin_agent/tools/scheduling_tools.py
+
+import datetime
+import json
+import os
+
+import dateutil.parser
+
+from core.busy_index import BusyIndex
+from qwen_agent.tools.base import BaseTool
+from tools.calendar_tools import MAX_RANGE_DAYS, GoogleCalendarTool
+
+# --- Slot Finder Settings ---
+# Where busy time comes from: 'events' reads the cached calendar events, 'freebusy' asks the
+# Calendar freebusy API for all calendars in one request.
+SLOT_FINDER_SOURCE = os.getenv('SLOT_FINDER_SOURCE', 'events')
+# Proposed slots start on multiples of this many minutes.
+SLOT_ALIGN_MINUTES = int(os.getenv('SLOT_ALIGN_MINUTES', '15'))
+DEFAULT_SEARCH_DAYS = 7
+
+class CalendarSlotFinderTool(BaseTool):
+    name = 'calendar_slot_finder'
+    description = (
+        'Finds free time slots of a given length across the user\'s calendars, within working hours. '
+        'Use it to propose meeting times or to check for conflicts before creating an event.'
+    )
+    parameters = [{
+        'name': 'duration_minutes',
+        'type': 'integer',
+        'description': 'The length of each slot in minutes.',
+        'required': True
+    }, {
+        'name': 'start_date',
+        'type': 'string',
+        'description': 'The first day to search, in YYYY-MM-DD format. Defaults to today.',
+        'required': False
+    }, {
+        'name': 'end_date',
+        'type': 'string',
+        'description': f'The last day to search (inclusive), in YYYY-MM-DD format. Defaults to {DEFAULT_SEARCH_DAYS} days from the start.',
+        'required': False
+    }, {
+        'name': 'count',
+        'type': 'integer',
+        'description': 'How many slots to return. Defaults to 3.',
+        'required': False
+    }, {
+        'name': 'day_start',
+        'type': 'string',
+        'description': 'The earliest start time on each day, as HH:MM. Defaults to 09:00.',
+        'required': False
+    }, {
+        'name': 'day_end',
+        'type': 'string',
+        'description': 'The latest end time on each day, as HH:MM. Defaults to 17:00.',
+        'required': False
+    }, {
+        'name': 'include_weekends',
+        'type': 'boolean',
+        'description': 'Whether Saturdays and Sundays may be proposed. Defaults to false.',
+        'required': False
+    }]
+
+    def __init__(self, cfg=None):
+        super().__init__(cfg)
+        cfg = cfg or {}
+        # Reuses the calendar reader, so busy time comes from the same cached, multi-calendar view.
+        self.reader = GoogleCalendarTool(cfg)
+        self.source = cfg.get('source', SLOT_FINDER_SOURCE)
+
+    def call(self, params: str, **kwargs) -> str:
+        try:
+            params_dict = self._parse_params(params)
+            duration = datetime.timedelta(minutes=int(params_dict.get('duration_minutes', 30)))
+            count = int(params_dict.get('count', 3))
+            first_day = self._parse_date(params_dict.get('start_date')) or datetime.date.today()
+            last_day = self._parse_date(params_dict.get('end_date')) or first_day + datetime.timedelta(days=DEFAULT_SEARCH_DAYS - 1)
+            if (last_day - first_day).days >= MAX_RANGE_DAYS:
+                return json.dumps({"error": f"The date range may cover at most {MAX_RANGE_DAYS} days."})
+            day_start = datetime.time.fromisoformat(params_dict.get('day_start', '09:00'))
+            day_end = datetime.time.fromisoformat(params_dict.get('day_end', '17:00'))
+
+            windows = working_windows(first_day, last_day, day_start, day_end,
+                                      bool(params_dict.get('include_weekends', False)))
+            # Calendar days are fetched as UTC days, so one day either side covers any local time-zone offset.
+            index = self.busy_index(first_day - datetime.timedelta(days=1), last_day + datetime.timedelta(days=1))
+            # Slots in the past are never proposed.
+            now = datetime.datetime.now().timestamp()
+            slots = index.free_slots(
+                now, windows[-1][1] if windows else now, duration.total_seconds(),
+                count, windows=windows, align=SLOT_ALIGN_MINUTES * 60
+            )
+            if not slots:
+                return json.dumps({"slots": [], "summary": "No free slots found in the requested range."})
+
+            formatted = [{
+                "start": datetime.datetime.fromtimestamp(start).astimezone().isoformat(timespec='minutes'),
+                "end": datetime.datetime.fromtimestamp(end).astimezone().isoformat(timespec='minutes')
+            } for start, end in slots]
+            return json.dumps({"slots": formatted, "summary": f"Found {len(formatted)} free slots."})
+        except Exception as e:
+            print(f"[Error in CalendarSlotFinderTool]: {e}")
+            return json.dumps({"error": f"An error occurred while finding free slots: {str(e)}"})
+
+    def busy_index(self, first_day: datetime.date, last_day: datetime.date) -> BusyIndex:
+        """Builds the busy-time index for a range of days from the configured source."""
+        if self.source == 'freebusy':
+            return BusyIndex(self._freebusy_intervals(first_day, last_day))
+        events, errors = self.reader.fetch_events(first_day, last_day)
+        if errors and not events:
+            raise RuntimeError("; ".join(errors))
+        return BusyIndex(busy_intervals(event for _, event in events))
+
+    def _freebusy_intervals(self, first_day: datetime.date, last_day: datetime.date) -> list:
+        body = {
+            'timeMin': datetime.datetime.combine(first_day, datetime.time.min).isoformat() + 'Z',
+            'timeMax': datetime.datetime.combine(last_day, datetime.time.max).isoformat() + 'Z',
+            'items': [{'id': calendar_id} for calendar_id in self.reader.calendar_ids]
+        }
+        response = self.reader.service.freebusy().query(body=body).execute()
+        return [
+            (dateutil.parser.isoparse(block['start']).timestamp(), dateutil.parser.isoparse(block['end']).timestamp())
+            for calendar in response.get('calendars', {}).values() for block in calendar.get('busy', [])
+        ]
+
+    def _parse_date(self, value: str):
+        return dateutil.parser.isoparse(value).date() if value else None
+
+    def _parse_params(self, params: str) -> dict:
+        try:
+            return json.loads(params)
+        except (json.JSONDecodeError, TypeError):
+            return {}
+
+
+def busy_intervals(events) -> list[tuple[float, float]]:
+    """
+    Converts calendar events into busy (start, end) epoch-second intervals. Events marked
+    'free' (transparent), cancelled events and invitations the user declined do not block time.
+    """
+    intervals = []
+    for event in events:
+        if event.get('transparency') == 'transparent' or event.get('status') == 'cancelled':
+            continue
+        if any(a.get('self') and a.get('responseStatus') == 'declined' for a in event.get('attendees', [])):
+            continue
+        start, end = event.get('start', {}), event.get('end', {})
+        if 'dateTime' in start and 'dateTime' in end:
+            intervals.append((dateutil.parser.isoparse(start['dateTime']).timestamp(),
+                              dateutil.parser.isoparse(end['dateTime']).timestamp()))
+        elif 'date' in start and 'date' in end:
+            # All-day events block the whole of their days in local time.
+            intervals.append((datetime.datetime.fromisoformat(start['date']).timestamp(),
+                              datetime.datetime.fromisoformat(end['date']).timestamp()))
+    return intervals
+
+def working_windows(first_day: datetime.date, last_day: datetime.date, day_start: datetime.time,
+                    day_end: datetime.time, include_weekends: bool = False) -> list[tuple[float, float]]:
+    """Returns the (start, end) epoch-second windows of working hours, in local time, on each day of a range."""
+    windows = []
+    for offset in range((last_day - first_day).days + 1):
+        day = first_day + datetime.timedelta(days=offset)
+        if not include_weekends and day.weekday() >= 5:
+            continue
+        start = datetime.datetime.combine(day, day_start).timestamp()
+        end = datetime.datetime.combine(day, day_end).timestamp()
+        if end > start:
+            windows.append((start, end))
+    return windows
@@ -1,16 +1,35 @@
 # digital_twin_agent/tools/style_retriever_tool.py
 
+import json
+import os
+from email.utils import parseaddr
+
 from qwen_agent.tools.base import BaseTool
-from core.vector_store_manager import VectorStoreManager
+from core.vector_store_manager import get_vector_store
+from tools.email_tools import recipient_key
+
+# --- Style Example Settings ---
+STYLE_EXAMPLES = int(os.getenv('STYLE_EXAMPLES', '3'))
+# Nearest neighbours fetched before near-duplicates are filtered out.
+STYLE_CANDIDATES = int(os.getenv('STYLE_CANDIDATES', '12'))
+# Cap on the combined size of the examples returned to the LLM, in tokens.
+STYLE_TOKEN_BUDGET = int(os.getenv('STYLE_TOKEN_BUDGET', '600'))
 
 class StyleRetrieverTool(BaseTool):
     name = 'style_retriever'
     description = "Retrieves examples of the user's personal writing style from a knowledge base."
-    parameters = [{'name': 'topic', 'type': 'string', 'description': 'The core topic of the email.', 'required': True}]
+    parameters = [
+        {'name': 'topic', 'type': 'string', 'description': 'The core topic of the email.', 'required': True},
+        {'name': 'recipient', 'type': 'string', 'description': 'Optional email address of the recipient, to get examples of how the user writes to them.', 'required': False}
+    ]
 
     def __init__(self, cfg=None):
         super().__init__(cfg)
-        self.vector_store = VectorStoreManager()
+
+    @property
+    def vector_store(self):
+        """The writing style collection, opened on first use."""
+        return get_vector_store()
 
     def call(self, params: str, **kwargs) -> str:
         try:
@@ -18,13 +37,25 @@ class StyleRetrieverTool(BaseTool):
             topic = params_dict.get('topic')
             if not topic:
                 return '{"error": "Topic parameter is missing."}'
-            search_results = self.vector_store.search(query_text=topic, n_results=3)
+            recipient = params_dict.get('recipient')
+            search_results = []
+            if recipient:
+                search_results = self._diverse_examples(topic, where={recipient_key(parseaddr(recipient)[1]): True})
+            # Fall back to the user's general style if there is no history with this recipient.
+            if not search_results:
+                search_results = self._diverse_examples(topic)
             if not search_results:
                 return '{"style_examples": "No relevant style examples found."}'
-            return f'{{"style_examples": "{"; ".join(search_results)}"}}'
+            return json.dumps({"style_examples": "; ".join(search_results)})
         except Exception as e:
             return f'{{"error": "An error occurred: {str(e)}"}}'
 
+    def _diverse_examples(self, topic: str, where: dict = None) -> list[str]:
+        """Returns relevant examples that are not near-duplicates of each other, within the token budget."""
+        return self.vector_store.search_diverse(
+            topic, n_results=STYLE_EXAMPLES, candidates=STYLE_CANDIDATES, where=where, token_budget=STYLE_TOKEN_BUDGET
+        )
+
     def _parse_params(self, params: str) -> dict:
         import json
         try:
@@ -2,9 +2,9 @@
 
 import base64
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
 
-from core.auth import get_google_credentials
+from core.auth import get_service
+from core.calendar_cache import get_calendar_cache
 from qwen_agent.tools.base import BaseTool
 
 class GmailSenderTool(BaseTool):
@@ -19,10 +19,13 @@ class GmailSenderTool(BaseTool):
 
     def __init__(self, cfg=None):
         super().__init__(cfg)
-        creds = get_google_credentials()
-        self.service = build('gmail', 'v1', credentials=creds)
         print("Gmail Sender tool initialized successfully.")
 
+    @property
+    def service(self):
+        """The Gmail API client for the calling thread."""
+        return get_service('gmail', 'v1')
+
     def call(self, params: str, **kwargs) -> str:
         """The main synchronous method executed by the agent."""
         try:
@@ -71,10 +74,13 @@ class CalendarCreatorTool(BaseTool):
 
     def __init__(self, cfg=None):
         super().__init__(cfg)
-        creds = get_google_credentials()
-        self.service = build('calendar', 'v3', credentials=creds)
         print("Calendar Creator tool initialized successfully.")
 
+    @property
+    def service(self):
+        """The Calendar API client for the calling thread."""
+        return get_service('calendar', 'v3')
+
     def call(self, params: str, **kwargs) -> str:
         """The main synchronous method executed by the agent."""
         try:
@@ -91,6 +97,8 @@ class CalendarCreatorTool(BaseTool):
 
             print(f"Tool Action: Creating calendar event '{event['summary']}'...")
             created_event = self.service.events().insert(calendarId='primary', body=event).execute()
+            # Write through, so the calendar reader sees the new event without waiting for a sync.
+            get_calendar_cache('primary').add_event(created_event)
             
             return f'{{"status": "success", "event_link": "{created_event.get("htmlLink")}"}}'
 